@@ -7,15 +7,67 @@ __status__  = "production"
 __version__ = "0.0.0.1"
 __date__    = "20 July 2022"
 
+import collections
+import csv
+import functools
 import logging
 import os
-import re
 import sys
 import traceback
 
-from inspect import currentframe, getouterframes
 from tqdm import tqdm
 
+# the buffer size used for reading input files
+READ_BUFFER_SIZE = 1 << 20
+
+# the maximum number of method lookups cached per process (see Object.resolve_method)
+RESOLVE_CACHE_SIZE = 1024
+
+# the parsed form of a provenance returned by Validator.parse_provenance
+Provenance = collections.namedtuple('Provenance', ['document_id', 'start_x', 'start_y', 'end_x', 'end_y'])
+
+def _is_number(value):
+    """
+    Returns True if value is a non-empty string of ASCII digits, optionally
+    preceded by a minus sign, False otherwise.
+    """
+    if value.startswith('-'):
+        value = value[1:]
+    return value.isascii() and value.isdigit()
+
+def _parse_coordinates(coordinates):
+    """
+    Parse a string of the form:
+        (start_x,start_y)-(end_x,end_y)
+    and return the tuple (start_x, start_y, end_x, end_y) of strings, or None
+    if the string is not of this form.
+    """
+    if not coordinates.startswith('(') or not coordinates.endswith(')'):
+        return
+    start, separator, end = coordinates[1:-1].partition(')-(')
+    if not separator:
+        return
+    start_x, start_separator, start_y = start.partition(',')
+    end_x, end_separator, end_y = end.partition(',')
+    if not (start_separator and end_separator and start_x and start_y and end_x and end_y):
+        return
+    return start_x, start_y, end_x, end_y
+
+def _parse_span(span_string):
+    """
+    Parse a string of the form:
+        document_id:(start_x,start_y)-(end_x,end_y)
+    and return the tuple (document_id, start_x, start_y, end_x, end_y) of strings,
+    or None if the string is not of this form.
+    """
+    index = span_string.find(':(')
+    if index < 0:
+        return
+    coordinates = _parse_coordinates(span_string[index+1:])
+    if coordinates is None:
+        return
+    return (span_string[:index],) + coordinates
+
 class Object(object):
     """
     This class represents an object which is envisioned to be the parent of most of the related classes.
@@ -23,6 +75,8 @@ class Object(object):
     At a high level this class is a wrapper around a single dictionary object which provides support for complex getters.
     """
 
+    __slots__ = ('logger',)
+
     def __init__(self, logger):
         """
         Initializes this instance, and sets the logger for newly created instance.
@@ -45,10 +99,10 @@ class Object(object):
         key = args[0]
         if key is None:
             self.get('logger').record_event('KEY_IS_NONE', self.get('code_location'))
-        method = self.get_method("get_{}".format(key))
-        if method is not None:
+        getter = type(self).resolve_getter(key)
+        if getter is not None:
             args = args[1:]
-            return method(*args, **kwargs)
+            return getter(self, *args, **kwargs)
         else:
             value = getattr(self, key, None)
             return value
@@ -58,13 +112,32 @@ class Object(object):
         Returns the method whose name matches the value stored in method_name,
         None otherwise.
         """
-        try:
-            method = getattr(self, method_name)
-            if not hasattr(method, "__call__"):
-                raise AttributeError()
-        except AttributeError:
-            method = None
-        return method
+        if type(self).resolve_method(method_name) is None:
+            return
+        return getattr(self, method_name)
+
+    @classmethod
+    @functools.lru_cache(maxsize=RESOLVE_CACHE_SIZE)
+    def resolve_method(cls, method_name):
+        """
+        Returns the function, defined by the class, whose name matches the value
+        stored in method_name, None otherwise.
+
+        The result is cached per class and method_name. The cache is bounded as
+        the names looked up through resolve_getter are made from whatever keys
+        are passed to Object.get, which include data keys (e.g. document IDs).
+        """
+        method = getattr(cls, method_name, None)
+        return method if callable(method) else None
+
+    @classmethod
+    def resolve_getter(cls, key):
+        """
+        Returns the function get_{key} defined by the class, None otherwise.
+
+        The lookup is cached by resolve_method.
+        """
+        return cls.resolve_method("get_{}".format(key))
 
     def get_code_location(self):
         """
@@ -76,8 +149,9 @@ class Object(object):
             filename
             lineno
         """
-        caller_frame_info = getouterframes(currentframe(), 2)[2]
-        where = {'filename': caller_frame_info.filename, 'lineno': caller_frame_info.lineno}
+        # skip this frame and that of Object.get through which this method is called
+        caller_frame = sys._getframe(2)
+        where = {'filename': caller_frame.f_code.co_filename, 'lineno': caller_frame.f_lineno}
         return where
 
     def record_event(self, event_code, *args):
@@ -103,6 +177,10 @@ class Container(Object):
     The AIDA container class.
 
     Internally, the instance of this class stores objects in a dictionary.
+
+    As long as values are only added without a key (i.e. keyed by their position),
+    the store is a list; it is converted into a dictionary when the first value is
+    added with a key.
     """
 
     def __init__(self, logger):
@@ -120,9 +198,9 @@ class Container(Object):
 
     def __iter__(self):
         """
-        Returns the iterator over the store.
+        Returns the iterator over the store's keys.
         """
-        return iter(self.store)
+        return iter(self.keys())
 
     def get(self, *args, **kwargs):
         """
@@ -132,13 +210,18 @@ class Container(Object):
         the value is looked up in the store, again returned if found. Otherwise, the
         key is added, to the store, with its value set to the default value provided
         or None, if no default value was provided.
+
+        NOTE: As a shortcut, a key found in the store, when no other arguments are
+        given, is returned from the store without looking it up in the parent object.
         """
         key = args[0]
+        if len(args) == 1 and not kwargs and self.exists(key):
+            return self.store[key]
         default = kwargs['default'] if 'default' in kwargs else None
         value = super().get(*args, **kwargs)
         if value:
             return value
-        elif key in self.store:
+        elif self.exists(key):
             return self.store[key]
         else:
             if value is None and default is not None:
@@ -151,7 +234,7 @@ class Container(Object):
         Sets the value of the key in the store if key is found in the store, otherwise,
         the object's setter is called.
         """
-        if key in self.store:
+        if self.exists(key):
             self.store[key] = value
         else:
             super().set(key, value)
@@ -160,17 +243,28 @@ class Container(Object):
         """
         Returns True if key is found in the store, False otherwise.
         """
-        return key in self.store
+        store = self.store
+        if isinstance(store, list):
+            return isinstance(key, int) and 0 <= key < len(store)
+        return key in store
 
     def add(self, value, key=None):
         """
         Adds the value to the store and map it to the key if provided, otherwise,
         use the length of the store as the key.
         """
+        store = self.store
         if key is None:
-            self.store[len(self.store)] = value
+            if isinstance(store, list):
+                store.append(value)
+            elif not store:
+                self.store = [value]
+            else:
+                store[len(store)] = value
         else:
-            self.store[key] = value
+            if isinstance(store, list):
+                store = self.store = dict(enumerate(store))
+            store[key] = value
 
     def add_member(self, member):
         """
@@ -186,13 +280,19 @@ class Container(Object):
         """
         Returns a new view of the store's keys.
         """
-        return self.store.keys()
+        store = self.store
+        if isinstance(store, list):
+            return range(len(store))
+        return store.keys()
 
     def values(self):
         """
         Returns a new view of the store's values.
         """
-        return self.store.values()
+        store = self.store
+        if isinstance(store, list):
+            return store
+        return store.values()
 
 class DocumentBoundaries(Container):
     """
@@ -213,6 +313,8 @@ class DocumentBoundaries(Container):
         """
         super().__init__(logger)
         self.filename = filename
+        # cache of document boundaries looked up by get_boundary, keyed by span_string
+        self.boundary_cache = {}
         # the implementation of load needs to come from the derived classes.
         self.load()
 
@@ -222,12 +324,15 @@ class DocumentBoundaries(Container):
             document_id:(start_x,start_y)-(end_x,end_y)
         Return the document boundary corresponding to the document element whose id is doceid.
         """
+        boundary_cache = self.boundary_cache
+        if span_string in boundary_cache:
+            return boundary_cache[span_string]
         document_boundary = None
-        search_obj = re.search( r'^(.*?):\((\d+),(\d+)\)-\((\d+),(\d+)\)$', span_string)
-        if search_obj:
-            document_id = search_obj.group(1)
-            if self.exists(document_id):
-                document_boundary = self.get(document_id)
+        parsed_span = _parse_span(span_string)
+        if parsed_span and all(value.isdecimal() for value in parsed_span[1:]):
+            document_id = parsed_span[0]
+            document_boundary = self.store.get(document_id)
+        boundary_cache[span_string] = document_boundary
         return document_boundary
 
 class Span(Object):
@@ -237,6 +342,8 @@ class Span(Object):
     TODO: Update this class for future use of the audio-only bounding box.
     """
 
+    __slots__ = ('start_x', 'start_y', 'end_x', 'end_y')
+
     def __init__(self, logger, start_x, start_y, end_x, end_y):
         """
         Initialize the Span object.
@@ -271,7 +378,7 @@ class Span(Object):
             START=(start_x,start_y)
             END=(end_x,end_y)
         """
-        return "{}-{}".format(self.get('START'), self.get('END'))
+        return f"({self.start_x},{self.start_y})-({self.end_x},{self.end_y})"
 
     def get_copy(self):
         return type(self)(self.get('logger'), self.get('start_x'), self.get('start_y'), self.get('end_x'), self.get('end_y'))
@@ -282,7 +389,7 @@ class Span(Object):
         in the form:
             (start_x,start_y)
         """
-        return "({},{})".format(self.start_x, self.start_y)
+        return f"({self.start_x},{self.start_y})"
 
     def get_END(self):
         """
@@ -290,7 +397,7 @@ class Span(Object):
         in the form:
             (end_x,end_y)
         """
-        return "({},{})".format(self.end_x, self.end_y)
+        return f"({self.end_x},{self.end_y})"
 
 class DocumentBoundary(Span):
     """
@@ -303,32 +410,39 @@ class DocumentBoundary(Span):
     passed as argument is inside the object boundary
     """
 
+    __slots__ = ('_fmin_x', '_fmin_y', '_fmax_x', '_fmax_y')
+
     def __init__(self, logger, start_x, start_y, end_x, end_y):
         """
         Initialize the DocumentBoundary object.
+
+        NOTE: The boundary is not expected to change after initialization as
+        its numeric value is computed here once and used by validate() and
+        get_corrected_span().
         """
         super().__init__(logger, start_x, start_y, end_x, end_y)
+        self._fmin_x = float(start_x)
+        self._fmin_y = float(start_y)
+        self._fmax_x = float(end_x)
+        self._fmax_y = float(end_y)
 
     def get_corrected_span(self, span):
-        min_x, min_y, max_x, max_y = map(lambda arg:float(self.get(arg)),
-                             ['start_x', 'start_y', 'end_x', 'end_y'])
-        sx, sy, ex, ey = map(lambda arg:float(span.get(arg)),
-                             ['start_x', 'start_y', 'end_x', 'end_y'])
+        min_x, min_y, max_x, max_y = self._fmin_x, self._fmin_y, self._fmax_x, self._fmax_y
+        sx, sy, ex, ey = float(span.start_x), float(span.start_y), float(span.end_x), float(span.end_y)
         # if the span is (0,0)-(0,0) return document boundary
         if sx+sy+ex+ey == 0:
             return self.get('span')
         if sx > max_x or sy > max_y or ex < min_x or ey < min_y:
             # can't correct, return None
             return
-        sx = self.get('start_x') if sx < min_x else span.get('start_x')
-        sy = self.get('start_y') if sy < min_y else span.get('start_y')
-        ex = self.get('end_x') if ex > max_x else span.get('end_x')
-        ey = self.get('end_y') if ey > max_y else span.get('end_y')
-        return Span(self.get('logger'), sx, sy, ex, ey)
+        sx = self.start_x if sx < min_x else span.start_x
+        sy = self.start_y if sy < min_y else span.start_y
+        ex = self.end_x if ex > max_x else span.end_x
+        ey = self.end_y if ey > max_y else span.end_y
+        return Span(self.logger, sx, sy, ex, ey)
 
     def get_span(self):
-        sx, sy, ex, ey = [self.get(arg) for arg in ['start_x', 'start_y', 'end_x', 'end_y']]
-        return Span(self.get('logger'), sx, sy, ex, ey)
+        return Span(self.logger, self.start_x, self.start_y, self.end_x, self.end_y)
 
     def validate(self, span):
         """
@@ -345,76 +459,114 @@ class DocumentBoundary(Span):
         This method throws exception if span is not as mentioned above.
         """
         if isinstance(span, str):
-            search_obj = re.search( r'^\((\d+),(\d+)\)-\((\d+),(\d+)\)$', span)
-            if search_obj:
-                start_x = search_obj.group(1)
-                start_y = search_obj.group(2)
-                end_x = search_obj.group(3)
-                end_y = search_obj.group(4)
-                span = Span(self.logger, start_x, start_y, end_x, end_y)
+            # the coordinates are compared directly without creating a Span object
+            coordinates = _parse_coordinates(span)
+            if coordinates and all(value.isdecimal() for value in coordinates):
+                start_x, start_y, end_x, end_y = coordinates
+                sx, sy, ex, ey = float(start_x), float(start_y), float(end_x), float(end_y)
             else:
                 raise Exception('{} is not of a form (start_x,start_y)-(end_x,end_y)'.format(span))
-
-        if isinstance(span, Span):
-            min_x, min_y, max_x, max_y = map(lambda arg:float(self.get(arg)),
-                                 ['start_x', 'start_y', 'end_x', 'end_y'])
-            sx, sy, ex, ey = map(lambda arg:float(span.get(arg)),
-                                 ['start_x', 'start_y', 'end_x', 'end_y'])
-            is_valid = False
-            if min_x <= sx <= max_x and min_x <= ex <= max_x and min_y <= sy <= max_y and min_y <= ey <= max_y:
-                is_valid = True
-            return is_valid
+        elif isinstance(span, Span):
+            sx, sy, ex, ey = float(span.start_x), float(span.start_y), float(span.end_x), float(span.end_y)
         else:
             raise TypeError('{} called with argument of unexpected type'.format(isinstance.__name__))
+        min_x, min_y, max_x, max_y = self._fmin_x, self._fmin_y, self._fmax_x, self._fmax_y
+        return min_x <= sx <= max_x and min_x <= ex <= max_x and min_y <= sy <= max_y and min_y <= ey <= max_y
 
 class Entry(Object):
     """
     The Entry represents a line in a tab separated file.
+
+    The entry does not hold the values itself; it is a view onto the column lists
+    of the FileHandler that loaded the file.
     """
 
-    def __init__(self, logger, keys, values, where):
+    # __dict__ is kept so that values other than columns can still be set on an entry
+    __slots__ = ('file_handler', 'index', '__dict__')
+
+    def __init__(self, logger, file_handler, index):
         """
         Initializes this instance.
 
         Arguments:
             logger (aida.Logger):
                 the aida.Logger object.
-            keys (list of str):
-                the list representing header fields.
-            values (list of str):
-                the list representing values corresponding to the keys.
-            where (dict):
-                a dictionary containing the following two keys representing the file location:
-                    filename
-                    lineno
-
-        NOTE: The length of keys and values must match.
+            file_handler (FileHandler):
+                the FileHandler holding the values of this entry.
+            index (int):
+                the position of this entry among the entries of the file_handler.
         """
         super().__init__(logger)
-        if len(keys) != len(values):
-            logger.record_event('UNEXPECTED_NUM_COLUMNS', len(keys), len(values), where)
-        self.where = where
-        for i in range(len(keys)):
-            self.set(keys[i].strip(), values[i].strip())
+        self.file_handler = file_handler
+        self.index = index
+
+    def get(self, *args, **kwargs):
+        """
+        Gets the value of the column whose name matches the key, if any, otherwise
+        falls back to Object.get.
+        """
+        file_handler = self.file_handler
+        column_index = file_handler.header.colindex.get(args[0])
+        if column_index is not None:
+            return file_handler.columns[column_index][self.index]
+        return super().get(*args, **kwargs)
+
+    def set(self, key, value):
+        """
+        Sets the value of the column whose name matches the key, if any, otherwise
+        falls back to Object.set.
+        """
+        file_handler = self.file_handler
+        column_index = file_handler.header.colindex.get(key)
+        if column_index is not None:
+            file_handler.columns[column_index][self.index] = value
+        else:
+            super().set(key, value)
 
     def get_filename(self):
         """
         Gets the name of the file which this instance corresponds to.
         """
-        return self.get('where').get('filename')
+        return self.file_handler.filename
+
+    def get_header(self):
+        """
+        Gets the header of the file which this instance corresponds to.
+        """
+        return self.file_handler.header
+
+    def get_line(self):
+        """
+        Gets the line which this instance corresponds to.
+
+        NOTE: The line is reconstructed from the (stripped) values of the entry.
+        """
+        return self.__str__()
 
     def get_lineno(self):
         """
         Gets the line number which this instance corresponds to.
         """
-        return self.get('where').get('lineno')
+        return self.file_handler.linenos[self.index]
+
+    def get_where(self):
+        """
+        Gets the dictionary containing the following two keys representing the file location:
+            filename
+            lineno
+        """
+        return {'filename': self.get_filename(), 'lineno': self.get_lineno()}
 
     def __str__(self):
-        return '{}\n'.format('\t'.join([self.get(column) for column in self.get('header').get('columns')]))
+        index = self.index
+        return '{}\n'.format('\t'.join([column[index] for column in self.file_handler.columns]))
 
 class FileHandler(Object):
     """
     File handler for reading tab-separated files.
+
+    The values are stored column-wise, i.e. one list per column, and Entry objects
+    are created on iteration as views onto these lists.
    """
 
     def __init__(self, logger, filename, header=None, encoding=None):
@@ -436,38 +588,63 @@ class FileHandler(Object):
         self.filename = filename
         self.header = header
         self.logger = logger
-        self.entries = []
+        # list of columns, in header order, each being the list of values in that column
+        self.columns = []
+        self.linenos = []
         self.load_file()
 
     def load_file(self):
         """
         Load the file.
         """
-        filename = self.get('filename')
-        with open(filename, encoding=self.get('encoding')) as file:
-            for lineno, line in enumerate(tqdm(file, desc='loading {}'.format(filename)), start=1):
-                if self.get('header') is None:
-                    self.header = FileHeader(self.get('logger'), line.rstrip())
-                else:
-                    where = {'filename': filename, 'lineno': lineno}
-                    entry = Entry(self.get('logger'), self.get('header').get('columns'),
-                                   line.rstrip('\r\n').split('\t', len(self.get('header').get('columns'))-1), where)
-                    entry.set('where', where)
-                    entry.set('header', self.get('header'))
-                    entry.set('line', line)
-                    self.get('entries').append(entry)
+        filename = self.filename
+        logger = self.logger
+        linenos = self.linenos
+        with open(filename, encoding=self.encoding, buffering=READ_BUFFER_SIZE, newline='') as file:
+            # the lines are split into values by the (C implemented) csv.reader
+            reader = csv.reader(file, delimiter='\t', quoting=csv.QUOTE_NONE)
+            numbered_rows = enumerate(tqdm(reader, desc='loading {}'.format(filename), mininterval=0.5, miniters=10000), start=1)
+            if self.header is None:
+                first = next(numbered_rows, None)
+                if first is None:
+                    return
+                self.header = FileHeader(logger, '\t'.join(first[1]).rstrip())
+            column_lists = self.columns = [[] for _ in self.header.columns]
+            num_columns = len(column_lists)
+            for lineno, values in numbered_rows:
+                if len(values) > num_columns:
+                    # the last column gets the remainder of the line
+                    values[num_columns-1:] = ['\t'.join(values[num_columns-1:])]
+                elif not values:
+                    values = ['']
+                if len(values) != num_columns:
+                    logger.record_event('UNEXPECTED_NUM_COLUMNS', num_columns, len(values), {'filename': filename, 'lineno': lineno})
+                    values += [None] * (num_columns - len(values))
+                for column_list, value in zip(column_lists, values):
+                    column_list.append(value.strip() if value is not None else None)
+                linenos.append(lineno)
+
+    def get_entries(self):
+        """
+        Returns the list of entries.
+        """
+        return list(self)
 
     def __iter__(self):
         """
         Returns iterator over entries.
         """
-        return iter(self.get('entries'))
+        logger = self.logger
+        for index in range(len(self.linenos)):
+            yield Entry(logger, self, index)
 
 class FileHeader(Object):
     """
     The object represending the header of a tab separated file.
     """
 
+    __slots__ = ('line', 'columns', 'colindex')
+
     def __init__(self, logger, header_line):
         """
         Initializes the FileHeader using header_line.
@@ -481,7 +658,9 @@ class FileHeader(Object):
         super().__init__(logger)
         self.logger = logger
         self.line = header_line
-        self.columns = list(re.split(r'\t', header_line))
+        self.columns = [sys.intern(column) for column in header_line.split('\t')]
+        # mapping from column name to its position in the header
+        self.colindex = {sys.intern(column.strip()): index for index, column in enumerate(self.columns)}
 
     def __str__(self, *args, **kwargs):
         """
@@ -523,19 +702,35 @@ class TextBoundaries(DocumentBoundaries):
         Read the segment boundary file to load document boundary
         information.
         """
-        for entry in tqdm(FileHandler(self.logger, self.filename), desc='processing segment boundaries'):
-            doceid, start_char, end_char = map(
-                    lambda arg: entry.get(arg),
-                    'document_id,start_char,end_char'.split(','))
-            document_boundary = self.get(doceid,
-                                         default=DocumentBoundary(self.logger,
-                                                                  start_char, 0, end_char, 0))
-            tb_start_char = document_boundary.get('start_x')
-            tb_end_char = document_boundary.get('end_x')
-            if int(start_char) < int(tb_start_char):
-                document_boundary.set('start_x', start_char)
-            if int(end_char) > int(tb_end_char):
-                document_boundary.set('end_x', end_char)
+        # only three columns of the file are needed, so the file is read using
+        # csv.reader instead of FileHandler, and the extreme segment offsets of each
+        # document are collected in a single pass before creating the (immutable)
+        # document boundaries
+        boundaries = {}
+        with open(self.filename, buffering=READ_BUFFER_SIZE) as file:
+            reader = csv.reader(file, delimiter='\t', quoting=csv.QUOTE_NONE)
+            columns = [column.strip() for column in next(reader, [])]
+            if not columns:
+                return
+            doceid_index, start_char_index, end_char_index = map(columns.index, ['document_id', 'start_char', 'end_char'])
+            for row in tqdm(reader, desc='processing segment boundaries', mininterval=0.5, miniters=10000):
+                if not row:
+                    continue
+                doceid = sys.intern(row[doceid_index].strip())
+                start_char, end_char = row[start_char_index].strip(), row[end_char_index].strip()
+                start, end = int(start_char), int(end_char)
+                # the boundary is stored as [start, start_char, end, end_char], i.e. both
+                # as numbers (for comparison) and as read from the file
+                boundary = boundaries.get(doceid)
+                if boundary is None:
+                    boundaries[doceid] = [start, start_char, end, end_char]
+                    continue
+                if start < boundary[0]:
+                    boundary[0:2] = start, start_char
+                if end > boundary[2]:
+                    boundary[2:4] = end, end_char
+        for doceid, (_, start_char, _, end_char) in boundaries.items():
+            self.add(key=doceid, value=DocumentBoundary(self.logger, start_char, 0, end_char, 0))
 
 """
 The logger class.
@@ -554,6 +749,8 @@ class Logger:
     event_specs = {}
     num_errors = 0
     num_warnings = 0
+    # the maximum number of recorded events remembered for suppressing duplicates
+    max_recorded = 10000
 
     def __init__(self, log_filename, event_specs_filename, argv, debug_level=logging.DEBUG):
         """
@@ -580,7 +777,8 @@ class Logger:
                     DEBUG = 10
                     NOTSET = 0                
         """
-        self.recorded = {}
+        # keys of the events recorded so far (see record_event), oldest first
+        self.recorded = collections.OrderedDict()
         self.log_filename = log_filename
         self.event_specs_filename = event_specs_filename
         self.path_name = os.getcwd()
@@ -637,7 +835,9 @@ class Logger:
         header = lines[0].strip().split(None, 2)
         for line in lines[1:]:
             line_dict = dict(zip(header, line.strip().split(None, 2)))
-            self.event_specs[line_dict['code']] = line_dict
+            # keep a reference to the bound format method of the message template
+            line_dict['format'] = line_dict['message'].format
+            self.event_specs[sys.intern(line_dict['code'])] = line_dict
 
     def record_event(self, event_code, *args, classname=None):
         """
@@ -669,19 +869,28 @@ class Logger:
             if isinstance(argslst[-1], dict):
                 where = argslst.pop()
         if event_code in self.event_specs:
+            classname = 'NO_CLASS_NAME' if classname is None else classname
+            # an event is recorded only once for a given classname, code and arguments
+            try:
+                recorded_key = (classname, event_code, tuple(argslst))
+                hash(recorded_key)
+            except TypeError:
+                recorded_key = (classname, event_code, tuple(str(arg) for arg in argslst))
+            if recorded_key in self.recorded:
+                return
+            self.recorded[recorded_key] = 1
+            if len(self.recorded) > self.max_recorded:
+                self.recorded.popitem(last=False)
             event_object = self.event_specs[event_code]
             event_type = event_object['type']
-            event_message = event_object['message'].format(*argslst)
-            classname = 'NO_CLASS_NAME' if classname is None else classname
+            event_message = event_object['format'](*argslst)
             event_message = '{classname} - {code} - {message}'.format(classname=classname, code=event_code, message=event_message)
-            if event_message in self.recorded:
-                return
-            self.recorded[event_message] = 1
             if where is not None:
                 event_message += " at " + where['filename'] + ":" + str(where['lineno'])
             if event_type.upper() == "CRITICAL":
-                self.logger_object.critical(event_message + "\n" + "".join(traceback.format_stack()))
-                sys.exit(event_message + "\n" + "".join(traceback.format_stack()))
+                stack = "".join(traceback.format_stack())
+                self.logger_object.critical(event_message + "\n" + stack)
+                sys.exit(event_message + "\n" + stack)
             elif event_type.upper() == "DEBUG":
                 self.logger_object.debug(event_message)
             elif event_type.upper() == "ERROR":
@@ -694,12 +903,14 @@ class Logger:
                 self.num_warnings = self.num_warnings + 1
             else:
                 error_message = "Unknown event type '" + event_type + "' for event: " + event_code
-                self.logger_object.error(error_message + "\n" + "".join(traceback.format_stack()))
-                sys.exit(error_message + "\n" + "".join(traceback.format_stack()))
+                stack = "".join(traceback.format_stack())
+                self.logger_object.error(error_message + "\n" + stack)
+                sys.exit(error_message + "\n" + stack)
         else:
             error_message = "Unknown log event: " + event_code
-            self.logger_object.error(error_message + "\n" + "".join(traceback.format_stack()))
-            sys.exit(error_message + "\n" + "".join(traceback.format_stack()))
+            stack = "".join(traceback.format_stack())
+            self.logger_object.error(error_message + "\n" + stack)
+            sys.exit(error_message + "\n" + stack)
 
     def record_program_invokation(self):
         """
@@ -728,21 +939,18 @@ class Normalizer(Object):
         if undo:
             attribute_name = attribute.get('name')
             value = entry.get(attribute_name)
-            search_obj = re.search('^(.*?):\((\S+),(\S+)\)-\((\S+),(\S+)\)$', value)
-            if search_obj:
-                document_id = search_obj.group(1)
-                start_x = search_obj.group(2)
-                end_x = search_obj.group(4)
+            parsed_span = _parse_span(value)
+            if parsed_span:
+                document_id, start_x, _, end_x, _ = parsed_span
                 unnormalized_value = '{}:{}-{}'.format(document_id, start_x, end_x)
                 entry.set(attribute_name, unnormalized_value)
         else:
             attribute_name = attribute.get('name')
             value = entry.get(attribute_name)
-            search_obj = re.search(r'^(.*?):(-?[0-9]+)-(-?[0-9]+)$', value)
-            if search_obj:
-                document_id = search_obj.group(1)
-                start_x = search_obj.group(2)
-                end_x = search_obj.group(3)
+            document_id, separator, offsets = value.rpartition(':')
+            index = offsets.find('-', 1)
+            start_x, end_x = offsets[:index], offsets[index+1:]
+            if separator and index > 0 and _is_number(start_x) and _is_number(end_x):
                 normalized_value = '{}:({},0)-({},0)'.format(document_id, start_x, end_x)
                 entry.set(attribute_name, normalized_value)
 
@@ -757,19 +965,16 @@ class Validator(Object):
     def __init__(self, logger):
         super().__init__(logger)
 
-    def parse_provenance(self, provenance):
+    @staticmethod
+    @functools.lru_cache(maxsize=100000)
+    def parse_provenance(provenance):
         # parse a string of the form "document_id:(start_x,start_y)-(end_x,end_y)" and
-        # return a dictionary object containing parsed fields.
-        search_obj = re.search('^(.*?):\((\S+),(\S+)\)-\((\S+),(\S+)\)$', provenance)
-        if not search_obj: return
-        document_id = search_obj.group(1)
-        start_x, start_y, end_x, end_y = map(lambda ID: int(search_obj.group(ID)), [2, 3, 4, 5])
-        return {
-            'document_id': document_id,
-            'start_x':start_x,
-            'start_y':start_y,
-            'end_x':end_x,
-            'end_y':end_y}
+        # return a Provenance object containing parsed fields.
+        parsed_span = _parse_span(provenance)
+        if not parsed_span: return
+        document_id = parsed_span[0]
+        start_x, start_y, end_x, end_y = map(int, parsed_span[1:])
+        return Provenance(document_id, start_x, start_y, end_x, end_y)
 
     def validate(self, caller, method_name, schema, entry, attribute, data):
         # this is the main method called by the validator script
@@ -802,21 +1007,24 @@ class Validator(Object):
         # - has offsets mentioned in proper order,
         # - has positive offsets,
         # - falls within document bounds
-        def parse(span):
-            return span.split(':')
         mention_span = entry.get(attribute.get('name'))
-        text_boundary = data.get('text_boundaries').get('boundary', mention_span)
+        text_boundaries = data['text_boundaries']
+        text_boundary = text_boundaries.get('boundary', mention_span)
         parsed_provenance = self.parse_provenance(mention_span)
-        if not data.get('text_boundaries').exists(parsed_provenance.get('document_id')):
-            self.record_event('UNKNOWN_DOCUMENT', mention_span, parsed_provenance.get('document_id'), entry.get('where'))
+        document_id = parsed_provenance.document_id
+        if not text_boundaries.exists(document_id):
+            self.record_event('UNKNOWN_DOCUMENT', mention_span, document_id, entry.get('where'))
             return False
-        if parsed_provenance.get('start_x') > parsed_provenance.get('end_x'):
+        start_x, end_x = parsed_provenance.start_x, parsed_provenance.end_x
+        if start_x > end_x:
             self.record_event('IMPROPER_OFFSET_ORDER', mention_span, entry.get('where'))
             return False
-        for start_or_end_x in ['start_x', 'end_x']:
-            if parsed_provenance.get(start_or_end_x) < 0:
-                self.record_event('NEGATIVE_OFFSET', start_or_end_x, mention_span, entry.get('where'))
-                return False
+        if start_x < 0:
+            self.record_event('NEGATIVE_OFFSET', 'start_x', mention_span, entry.get('where'))
+            return False
+        if end_x < 0:
+            self.record_event('NEGATIVE_OFFSET', 'end_x', mention_span, entry.get('where'))
+            return False
         if not text_boundary.validate(mention_span.split(':')[1]):
             self.record_event('SPAN_OFF_BOUNDARY', mention_span, text_boundary, entry.get('where'))
             return False
@@ -833,8 +1041,9 @@ class Validator(Object):
 
     def validate_set_membership(self, name, allowed_values, values, where):
         # this method is used by other methods to check if all values are in allowed values
-        for value in sorted(values.split(',')):
-            if value not in allowed_values:
-                self.record_event('UNKNOWN_VALUE', name, value, ', '.join(sorted(allowed_values)), where)
-                return False
+        unknown_values = set(values.split(',')).difference(allowed_values)
+        if unknown_values:
+            # report the first unknown value in sorted order
+            self.record_event('UNKNOWN_VALUE', name, min(unknown_values), ', '.join(sorted(allowed_values)), where)
+            return False
         return True
\ No newline at end of file
@@ -8,18 +8,23 @@ __version__ = "1.0.0.1"
 __date__    = "20 July 2022"
 
 import argparse
+import functools
 import os
 import re
 import sys
 import textwrap
 import traceback
 
-from rufeslib import FileHandler, FileHeader, RUFESObject, TextBoundaries, Normalizer, Validator
+from concurrent.futures import ProcessPoolExecutor
+from rufeslib import FileHandler, FileHeader, RUFESObject, TextBoundaries, Normalizer, Validator, READ_BUFFER_SIZE
 from tqdm import tqdm
 
 ALLOK_EXIT_CODE = 0
 ERROR_EXIT_CODE = 255
 
+# the number of output lines written at a time
+WRITE_BATCH_SIZE = 1024
+
 def check_paths(exist=[], donot_exist=[]):
     def check_for_paths_existance(paths):
         for path in paths:
@@ -35,6 +40,56 @@ def check_paths(exist=[], donot_exist=[]):
     check_for_paths_existance(exist)
     check_for_paths_non_existance(donot_exist)
 
+@functools.lru_cache(maxsize=None)
+def segment_order(segment_id):
+    """
+    Return the sort key for segment_id which is of the form <prefix>-<number>.
+    """
+    prefix, _, number = segment_id.rpartition('-')
+    return (prefix, int(number))
+
+def read_segment_boundaries(filepath):
+    """
+    Read the segment boundaries from the LTF file at filepath, and return a
+    dictionary mapping segment ID to the tuple of strings:
+        (start_char, end_char, start_segment_offset, end_segment_offset)
+
+    The file is streamed line-by-line so that only the current line is held in
+    memory. The offsets are character offsets into the file which is why the
+    lines are scanned directly rather than handed over to an XML parser.
+    """
+    def parse(s):
+        # s is a stripped line starting with '<SEG'
+        parsed = None
+        if s.endswith('>'):
+            parsed = {}
+            for key_and_value in s[4:-1].split():
+                key, value = [i.strip().strip('"') for i in key_and_value.split('=')]
+                parsed[key] = value
+        return parsed
+    segment_boundaries = {}
+    with open(filepath, buffering=READ_BUFFER_SIZE) as fh:
+        running_offset, start_segment_offset, end_segment_offset, segment_id, start_char, end_char = [0,0,0,0,0,0]
+        for line in fh:
+            length = len(line)
+            # only lines carrying a SEG tag need any further work
+            if 'SEG' not in line:
+                running_offset += length
+                continue
+            line = line.strip()
+            if line.startswith('<SEG'):
+                parsed = parse(line)
+                if parsed:
+                    start_segment_offset = running_offset
+                    end_char = parsed['end_char']
+                    segment_id = parsed['id']
+                    start_char = parsed['start_char']
+            elif line == '</SEG>':
+                end_segment_offset = running_offset + length - 1;
+                segment_boundaries[segment_id] = (start_char, end_char, str(start_segment_offset), str(end_segment_offset))
+            running_offset += length
+    return segment_boundaries
+
 class GenerateSegmentBoundaries(RUFESObject):
     """
     Class for generating segment boundaries.
@@ -44,73 +99,29 @@ class GenerateSegmentBoundaries(RUFESObject):
         super().__init__(**kwargs)
 
     def __call__(self):
-        def order(segment_id):
-            elements = segment_id.split('-')
-            p2 = int(elements.pop())
-            p1 = '-'.join(elements)
-            return [p1, p2]
-        def tostring(fields, entry=None):
-            values = []
-            for fieldname in fields:
-                value = fieldname
-                if entry is not None:
-                    value = str(entry.get(fieldname))
-                values.append(value)
-            return '\t'.join(values)
-        def parse(s):
-            parsed = None
-            m = re.match('^<SEG(.*?)>$', s)
-            if m:
-                parsed = {}
-                s = m.group(1).strip()
-                for key_and_value in s.split():
-                    key, value = [i.strip().strip('"') for i in key_and_value.split('=')]
-                    parsed[key] = value
-            return parsed
         ltfdir = self.get('ltf')
         segment_boundaries = {}
-        items = os.listdir(ltfdir)
-        filenames = [i for i in items if i.endswith('.ltf.xml')]
-        for filename in tqdm(filenames):
-            document_id = filename.replace('.ltf.xml', '')
-            filepath = os.path.join(ltfdir, filename)
-            if os.path.isfile(filepath):
-                segment_boundaries[document_id] = {}
-                with open(filepath) as fh:
-                    running_offset, start_segment_offset, end_segment_offset, segment_id, start_char, end_char = [0,0,0,0,0,0]
-                    for line in fh.readlines():
-                        length = len(line)
-                        line = line.strip()
-                        parsed = parse(line)
-                        if parsed:
-                            start_segment_offset = running_offset
-                            end_char = parsed['end_char']
-                            segment_id = parsed['id']
-                            start_char = parsed['start_char']
-                        if re.match('^<\/SEG>$', line):
-                            end_segment_offset = running_offset + length - 1;
-                            segment_boundaries[document_id][segment_id] = {
-                                    'START_CHAR': start_char,
-                                    'END_CHAR': end_char,
-                                    'START_SEGMENT_OFFSET': start_segment_offset,
-                                    'END_SEGMENT_OFFSET': end_segment_offset,
-                                }
-                        running_offset += length
+        filepaths = {}
+        with os.scandir(ltfdir) as items:
+            for item in items:
+                if item.name.endswith('.ltf.xml') and item.is_file():
+                    document_id = item.name[:-len('.ltf.xml')]
+                    filepaths[document_id] = item.path
+        # the files are independent of each other so read them in parallel
+        with ProcessPoolExecutor() as executor:
+            results = executor.map(read_segment_boundaries, filepaths.values(), chunksize=16)
+            for document_id, boundaries in tqdm(zip(filepaths, results), total=len(filepaths)):
+                segment_boundaries[document_id] = boundaries
         fields = ['document_id', 'segment_id', 'start_char', 'end_char', 'start_segment_offset', 'end_segment_offset']
-        header = tostring(fields)
-        lines = [header]
-        for document_id in sorted(segment_boundaries):
-            for segment_id in sorted(segment_boundaries.get(document_id), key=order):
-                start_char, end_char, start_segment_offset, end_segment_offset = [segment_boundaries.get(document_id).get(segment_id).get(fn) for fn in ['START_CHAR', 'END_CHAR', 'START_SEGMENT_OFFSET', 'END_SEGMENT_OFFSET']]
-                entry = {'document_id': document_id,
-                         'segment_id': segment_id,
-                         'start_char': start_char,
-                         'end_char': end_char,
-                         'start_segment_offset': start_segment_offset,
-                         'end_segment_offset': end_segment_offset}
-                lines.append(tostring(fields, entry=entry))
-        with open(self.get('output'), 'w') as program_output:
-            program_output.write('\n'.join(lines))
+        with open(self.get('output'), 'w', buffering=READ_BUFFER_SIZE) as program_output:
+            # rows are written as they are generated; each one is preceded by
+            # a newline so that the file does not end with one
+            program_output.write('\t'.join(fields))
+            for document_id in sorted(segment_boundaries):
+                document_segment_boundaries = segment_boundaries.get(document_id)
+                for segment_id in sorted(document_segment_boundaries, key=segment_order):
+                    program_output.write('\n')
+                    program_output.write('\t'.join((document_id, segment_id) + document_segment_boundaries[segment_id]))
         exit(ALLOK_EXIT_CODE)
 
     @classmethod
@@ -175,30 +186,51 @@ class ValidateResponses(RUFESObject):
 
     def __call__(self):
         # the entrypoint method
-        def validate(self, schema, entry, columns, data):
-            # the method for validating an entry (i.e. a line in responses or gold file)
-            valid = True
-            # normalize and validate all fields in the entry
+        def get_pipeline(self, columns):
+            # resolve the normalizer and validator methods of all columns once,
+            # returning a tuple of (attribute_name, attribute, normalize, validate) tuples
+            normalizer = self.get('normalizer')
+            validator = self.get('validator')
+            pipeline = []
             for column_name in columns:
-                column_spec = self.attributes[column_name]
-                normalizer_name = column_spec.get('normalize')
+                attribute = self.attributes[column_name]
+                normalize = validate = None
+                normalizer_name = attribute.get('normalize')
                 if normalizer_name:
-                    self.get('normalizer').normalize(self, normalizer_name, entry, self.attributes[column_name])
-                validator_name = column_spec.get('validate')
+                    normalize = normalizer.get_method(normalizer_name)
+                    if normalize is None:
+                        normalizer.record_event('UNDEFINED_METHOD', normalizer_name)
+                validator_name = attribute.get('validate')
                 if validator_name:
-                    valid_attribute = self.get('validator').validate(self, validator_name, schema, entry, self.attributes[column_name], data)
-                if normalizer_name:
-                    self.get('normalizer').normalize(self, normalizer_name, entry, self.attributes[column_name], undo=True)
-                if not valid_attribute:
+                    validate = validator.get_method(validator_name)
+                    if validate is None:
+                        validator.record_event('UNDEFINED_METHOD', validator_name)
+                pipeline.append((attribute.get('name'), attribute, normalize, validate))
+            return tuple(pipeline)
+        def validate(self, schema, entry, pipeline, data):
+            # the method for validating an entry (i.e. a line in responses or gold file)
+            valid = True
+            # normalize and validate all fields in the entry
+            for attribute_name, attribute, normalize, validate in pipeline:
+                if normalize:
+                    value = entry.get(attribute_name)
+                    normalize(self, entry, attribute, False)
+                if validate and not validate(self, schema, entry, attribute, data):
                     valid = False
+                if normalize:
+                    if entry.get(attribute_name) is not value:
+                        # undoing the normalization gives back the original value
+                        entry.set(attribute_name, value)
+                    else:
+                        normalize(self, entry, attribute, True)
             return valid
         logger = self.get('logger')
         # load allowed entity types
-        allowed_entity_types = [e.get('type') for e in FileHandler(logger, self.get('ontology_types'), header=FileHeader(logger, 'type'))]
+        allowed_entity_types = frozenset(e.get('type') for e in FileHandler(logger, self.get('ontology_types'), header=FileHeader(logger, 'type')))
         # load text boundaries
         text_boundaries = TextBoundaries(logger, self.get('segment_boundaries'))
         # initialize allowed mention types
-        allowed_mention_types = ['NAM', 'NOM', 'PRO']
+        allowed_mention_types = frozenset(['NAM', 'NOM', 'PRO'])
         data = {'allowed_entity_types': allowed_entity_types,
                 'allowed_mention_types': allowed_mention_types,
                 'text_boundaries': text_boundaries}
@@ -207,16 +239,22 @@ class ValidateResponses(RUFESObject):
         header = FileHeader(logger, '\t'.join(columns))
         # read input file
         entries = FileHandler(logger, self.get('input'), header=header, encoding='utf-8')
-        with open(self.get('output'), 'w') as program_output:
-            # validate all entries
+        pipeline = get_pipeline(self, columns)
+        with open(self.get('output'), 'w', buffering=READ_BUFFER_SIZE) as program_output:
+            # validate all entries, collecting the valid ones into batches that
+            # are written together
+            lines = []
             for entry in entries:
                 valid = True
-                valid_attribute = validate(self, schema, entry, columns, data)
+                valid_attribute = validate(self, schema, entry, pipeline, data)
                 if not valid_attribute: valid = False
                 entry.set('valid', valid)
-                # write entry to output file if it is valid
                 if valid:
-                    program_output.write(entry.__str__())
+                    lines.append(entry.__str__())
+                    if len(lines) == WRITE_BATCH_SIZE:
+                        program_output.writelines(lines)
+                        lines.clear()
+            program_output.writelines(lines)
         self.record_event('DEFAULT_INFO', 'Execution ends')
 
     def get_schema(self):
@@ -9,10 +9,13 @@ __date__    = "18 May 2021"
 
 import argparse
 import os
+import shutil
 
 ALLOK_EXIT_CODE = 0
 ERROR_EXIT_CODE = 255
 
+COPY_BUFFER_SIZE = 1 << 20
+
 def check_for_paths_existance(paths):
     for path in paths:
         if not os.path.exists(path):
@@ -25,33 +28,45 @@ def check_for_paths_non_existance(paths):
             print('Error: Path {} exists'.format(path))
             exit(ERROR_EXIT_CODE)
 
+CRITERIA = {
+    'NAM': frozenset(['NAM']),
+    'NOM': frozenset(['NOM']),
+    'PRO': frozenset(['PRO']),
+    'NAM-NOM': frozenset(['NAM', 'NOM']),
+    'NAM-PRO': frozenset(['NAM', 'PRO']),
+    'NOM-PRO': frozenset(['NOM', 'PRO'])
+    }
+
+MENTION_TYPE_COLUMN = 6
+
+def get_field(line, index):
+    # locate the index-th tab-separated field without splitting the whole line
+    start = 0
+    for _ in range(index):
+        start = line.index('\t', start) + 1
+    end = line.find('\t', start)
+    return line[start:] if end == -1 else line[start:end]
+
 def filter_lines(filter_name, input_file, output_file):
-    def check(line, filter_name):
-        elements = line.split('\t')
-        criteria = {
-            'NAM': ['NAM'],
-            'NOM': ['NOM'],
-            'PRO': ['PRO'],
-            'NAM-NOM': ['NAM', 'NOM'],
-            'NAM-PRO': ['NAM', 'PRO'],
-            'NOM-PRO': ['NOM', 'PRO']
-            }
-        if filter_name == 'complete':
-            return True
-        if elements[6] in criteria[filter_name]:
-            return True
-        return False
+    if filter_name == 'complete':
+        # every line is kept so copy the file as is
+        with open(input_file, 'rb') as fh, open(output_file, 'wb') as program_output:
+            shutil.copyfileobj(fh, program_output, COPY_BUFFER_SIZE)
+        return
+    allowed_mention_types = CRITERIA[filter_name]
     program_output = open(output_file, 'w')
     with open(input_file) as fh:
-        for line in fh.readlines():
-            if check(line, filter_name):
+        for line in fh:
+            if get_field(line, MENTION_TYPE_COLUMN) in allowed_mention_types:
                 program_output.write(line)
     program_output.close()
 
 def main(args):
-    check_for_paths_existance([args.input])
-    check_for_paths_non_existance([args.output])
-    filter_lines(args.filter, args.input, args.output)
+    file_pairs = [(args.input, args.output)] + (args.pair or [])
+    check_for_paths_existance([input_file for input_file, _ in file_pairs])
+    check_for_paths_non_existance([output_file for _, output_file in file_pairs])
+    for input_file, output_file in file_pairs:
+        filter_lines(args.filter, input_file, output_file)
     exit(ALLOK_EXIT_CODE)
 
 if __name__ == '__main__':
@@ -60,5 +75,6 @@ if __name__ == '__main__':
     parser.add_argument('filter', choices=['complete', 'NAM', 'NOM', 'PRO', 'NAM-NOM', 'NAM-PRO', 'NOM-PRO'], help='Specify the name of the filter to be applied')
     parser.add_argument('input', type=str, help='Specify the input file')
     parser.add_argument('output', type=str, help='Specify the output file')
+    parser.add_argument('-p', '--pair', nargs=2, action='append', metavar=('INPUT', 'OUTPUT'), help='Specify an additional input file to be filtered into the corresponding output file (may be repeated)')
     args = parser.parse_args()
     main(args)
\ No newline at end of file
@@ -10,10 +10,13 @@ __date__    = "18 May 2021"
 from logger import Logger
 
 import argparse
+import collections
+import concurrent.futures
+import contextlib
 import datetime
 import json
 import os
-import re
+import subprocess
 import sys
 
 ALLOK_EXIT_CODE = 0
@@ -21,25 +24,97 @@ ERROR_EXIT_CODE = 255
 
 EXPECTED_NUM_OF_TYPING_SCORE_FILES = 6
 
+# the neleval columns copied into the results
+EVALUATION_METRICS = frozenset(['precis', 'recall', 'fscore'])
+
+READ_BUFFER_SIZE = 1 << 20
+
 choices = ['complete', 'NAM', 'NOM', 'PRO', 'NAM-NOM', 'NAM-PRO', 'NOM-PRO']
 
-def call_system(cmd):
-    cmd = ' '.join(cmd.split())
-    print(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + ": running system command: '{}'".format(cmd))
-    os.system(cmd)
+def call_system(cmd, stdin=None, stdout=None):
+    # run the command, given as a list of arguments, without a shell; stdin and
+    # stdout optionally name the files from and to which it should be redirected
+    message = ' '.join(cmd)
+    if stdin is not None:
+        message += f' < {stdin}'
+    if stdout is not None:
+        message += f' > {stdout}'
+    print(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + f": running system command: '{message}'")
+    sys.stdout.flush()
+    with contextlib.ExitStack() as stack:
+        stdin_fh = stack.enter_context(open(stdin)) if stdin is not None else None
+        stdout_fh = stack.enter_context(open(stdout, 'w')) if stdout is not None else None
+        subprocess.run(cmd, stdin=stdin_fh, stdout=stdout_fh)
+
+def generate_tsv(input_file, output_file):
+    # convert the responses (or gold annotations) in input_file into the tab-separated
+    # format read by neleval. The lines are handled as bytes, and fields are split the
+    # way perl does, dropping trailing empty fields, so that the output is the same as
+    # that of the genTSV.pl script which this function replaces.
+    def split(value, separator):
+        fields = value.split(separator)
+        while fields and not fields[-1]:
+            fields.pop()
+        return fields
+    def get(fields, index):
+        return fields[index] if index < len(fields) else b''
+    print(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + f": generating tsv: '{input_file} > {output_file}'")
+    mention_ids = {}
+    old_document_id = b'this'
+    entity_index = 101
+    document_index = 100
+    with open(input_file, 'rb', buffering=READ_BUFFER_SIZE) as fh, open(output_file, 'wb', buffering=READ_BUFFER_SIZE) as program_output:
+        for line in fh:
+            if line.endswith(b'\n'):
+                line = line[:-1]
+            fields = split(line, b'\t')
+            mention_span, entity_id, entity_types, confidence = [get(fields, i) for i in (3, 4, 5, 7)]
+            span_fields = split(mention_span, b':')
+            document_id, span = get(span_fields, 0), get(span_fields, 1)
+            offsets = split(span, b'-')
+            start, end = get(offsets, 0), get(offsets, 1)
+            entity_key = document_id + b'-' + entity_id
+            # keep only the top-level entity types
+            entity_types = b';'.join(sorted(t for t in split(entity_types, b';') if b'.' not in t))
+            if document_id != old_document_id:
+                entity_index = 101
+                old_document_id = document_id
+                document_index += 1
+                mention_ids[entity_key] = f'NIL{document_index}{entity_index}'.encode()
+            elif entity_key not in mention_ids:
+                entity_index += 1
+                mention_ids[entity_key] = f'NIL{document_index}{entity_index}'.encode()
+            program_output.write(b'\t'.join([document_id, start, end, mention_ids[entity_key], confidence, entity_types]) + b'\n')
+
+def get_last_line(filename, block_size=4096):
+    # return the last line of the file without reading the whole file: blocks are
+    # read backwards from the end until the start of the last line is found
+    with open(filename, 'rb') as fh:
+        end = fh.seek(0, os.SEEK_END)
+        start = end
+        last_line = b''
+        while start > 0:
+            start = max(0, start - block_size)
+            fh.seek(start)
+            tail = fh.read(end - start)
+            if tail.endswith(b'\n'):
+                tail = tail[:-1]
+            before, newline, last_line = tail.rpartition(b'\n')
+            if newline:
+                break
+    return last_line.decode()
 
 def get_problems(logs_directory):
     num_errors = 0
-    stats = {}
+    stats = collections.Counter()
     for filename in os.listdir(logs_directory):
-        filepath = '{}/{}'.format(logs_directory, filename)
-        fh = open(filepath)
-        for line in fh.readlines():
-            if 'ERROR' in line:
+        filepath = f'{logs_directory}/{filename}'
+        with open(filepath, buffering=READ_BUFFER_SIZE) as fh:
+            for line in fh:
+                if 'ERROR' not in line: continue
                 num_errors += 1
-                error_type = line.split('-')[3].strip()
-                stats[error_type] = stats.get(error_type, 0) + 1
-        fh.close()
+                error_type = line.split('-', 4)[3].strip()
+                stats[error_type] += 1
     return num_errors, stats
 
 def record_and_display_message(logger, message):
@@ -48,16 +123,23 @@ def record_and_display_message(logger, message):
     print("----------------------------------------------------------")
     logger.record_event('DEFAULT_INFO', message)
 
+def run_for_all_filters(function):
+    # call function for each of the filters concurrently
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(choices)) as executor:
+        # consume the results so that exceptions raised by function are propagated
+        list(executor.map(function, choices))
+
 def get_leaderboard_metric_mapping(scores):
+    prefix = 'complete:'
+    suffix = ':fscore'
     mapping = {}
     for metric_name in scores:
-        if metric_name.startswith('complete:'):
-            new_metric_name = metric_name.replace('complete:', '')
-            if new_metric_name in ['ClusterTypesMetricV1', 'MentionTypesMetricV1']:
-                mapping[new_metric_name] = metric_name
-            if new_metric_name.endswith(':fscore'):
-                new_metric_name = new_metric_name.replace(':fscore', '')
-                mapping[new_metric_name] = metric_name
+        if not metric_name.startswith(prefix): continue
+        new_metric_name = metric_name[len(prefix):]
+        if new_metric_name in ('ClusterTypesMetricV1', 'MentionTypesMetricV1'):
+            mapping[new_metric_name] = metric_name
+        elif new_metric_name.endswith(suffix):
+            mapping[new_metric_name[:-len(suffix)]] = metric_name
     return mapping
 
 def generate_results_file_and_exit(logger, logs_directory, exit_code=ALLOK_EXIT_CODE):
@@ -68,45 +150,42 @@ def generate_results_file_and_exit(logger, logs_directory, exit_code=ALLOK_EXIT_
 
     scores = {}
     for dir_name in choices:
+        directory = f'{args.output}/{dir_name}'
         typing = []
         expected = EXPECTED_NUM_OF_TYPING_SCORE_FILES
-        for filename in os.listdir(os.path.join(args.output, dir_name, 'typing')):
-            if filename.endswith('-scores.txt'):
-                typing.append(os.path.join(args.output, dir_name, 'typing', filename))
-                expected -= 1
+        with os.scandir(f'{directory}/typing') as items:
+            for item in items:
+                if item.name.endswith('-scores.txt') and item.is_file():
+                    typing.append(item.path)
+                    expected -= 1
         if expected != 0:
             exit_code = ERROR_EXIT_CODE
 
         for filename in typing:
-            metric_name = filename.split('/')[-1].split('-')[0]
-            with open(filename) as fh:
-                last_line = None
-                for line in fh.readlines():
-                    line = line.strip()
-                    last_line = line
-                if last_line.startswith('Summary'):
-                    scores['{prefix}:{metric_name}'.format(prefix=filename.split('/')[2], metric_name=metric_name)] = float(last_line.split()[-1])
-                else:
-                    exit_code = ERROR_EXIT_CODE
+            metric_name = os.path.basename(filename).partition('-')[0]
+            last_line = get_last_line(filename).strip()
+            if last_line.startswith('Summary'):
+                scores[f'{dir_name}:{metric_name}'] = float(last_line.rsplit(None, 1)[-1])
+            else:
+                exit_code = ERROR_EXIT_CODE
 
         found = False
-        for filename in os.listdir(os.path.join(args.output, dir_name)):
-            if os.path.isfile(os.path.join(args.output, dir_name, filename)):
-                if filename.endswith('.evaluation'):
-                    with open(os.path.join(args.output, dir_name, filename)) as fh:
-                        header = None
-                        for line in fh.readlines():
-                            line = line.strip()
-                            if header is None:
-                                header = line.split()
-                            else:
-                                entry = dict(zip(header, line.split()))
-                                metric_names = [k for k in entry.keys() if k != 'measure']
-                                for name in metric_names:
-                                    if name not in ['precis', 'recall', 'fscore']: continue
-                                    metric_name = '{prefix}:{measure}:{name}'.format(prefix=dir_name, measure=entry['measure'], name=name)
-                                    scores[metric_name] = float(entry[name])
-                                    found = True
+        with os.scandir(directory) as items:
+            evaluation_files = [item.path for item in items if item.name.endswith('.evaluation') and item.is_file()]
+        for filename in evaluation_files:
+            with open(filename) as fh:
+                header = fh.readline().split()
+                # resolve the positions of the needed columns once
+                columns = [(name, index) for index, name in enumerate(header) if name in EVALUATION_METRICS]
+                if columns:
+                    measure_index = header.index('measure')
+                for line in fh:
+                    values = line.split()
+                    if not values: continue
+                    for name, index in columns:
+                        metric_name = f'{dir_name}:{values[measure_index]}:{name}'
+                        scores[metric_name] = float(values[index])
+                        found = True
 
         if not found:
             exit_code = ERROR_EXIT_CODE
@@ -123,14 +202,15 @@ def generate_results_file_and_exit(logger, logs_directory, exit_code=ALLOK_EXIT_
         source_metric_name = leaderboard_metric_mapping[new_metric_name]
         scores[new_metric_name] = scores[source_metric_name]
 
+    # the scores are sorted once here so that the encoder does not have to
     output = {'scores' : [
-                            scores
+                            dict(sorted(scores.items()))
                          ]
             }
 
     outputdir = "/score/"
     with open(outputdir + 'results.json', 'w') as fp:
-        json.dump(output, fp, indent=4, sort_keys=True)
+        json.dump(output, fp, indent=4)
 
     exit_message = 'Done.'
     record_and_display_message(logger, exit_message)
@@ -145,21 +225,23 @@ def main(args):
     print("Checking if input/output directories exist.")
     for path in [args.input, args.output]:
         if not os.path.exists(path):
-            print('ERROR: Path {} does not exist'.format(path))
+            print(f'ERROR: Path {path} does not exist')
             exit(ERROR_EXIT_CODE)
     print("Checking if output directory is empty.")
-    files = [f for f in os.listdir(args.output)]
-    if len(files) > 0:
-        print('ERROR: Output directory {} is not empty'.format(args.output))
+    with os.scandir(args.output) as items:
+        # stop at the first entry instead of listing the whole directory
+        non_empty = any(True for _ in items)
+    if non_empty:
+        print(f'ERROR: Output directory {args.output} is not empty')
         exit(ERROR_EXIT_CODE)
 
     #############################################################################################
     # create logger
     #############################################################################################
 
-    logs_directory = '{output}/{logs}'.format(output=args.output, logs=args.logs)
-    run_log_file = '{logs_directory}/run.log'.format(logs_directory=logs_directory)
-    call_system('mkdir {logs_directory}'.format(logs_directory=logs_directory))
+    logs_directory = f'{args.output}/{args.logs}'
+    run_log_file = f'{logs_directory}/run.log'
+    os.makedirs(logs_directory, exist_ok=True)
     logger = Logger(run_log_file, args.spec, sys.argv)
 
     #############################################################################################
@@ -167,27 +249,26 @@ def main(args):
     #############################################################################################
 
     record_and_display_message(logger, 'Inspecting the input directory.')
-    items = [f for f in os.listdir(args.input)]
-
     num_files = 0
     num_directories = 0
     num_others = 0
 
     filename = None
 
-    for item in items:
-        if not item.endswith('.tab'):
-            num_others += 1
-        if item.startswith('.'):
-            num_others += 1
-        if os.path.isfile(os.path.join(args.input, item)):
-            if item.endswith('.tab'):
-                filename = re.match(r"^(.*?)\.tab$", item).group(1)
+    # each item is counted once: as a directory, as a file, or as something else;
+    # a file that is hidden or not a .tab file also counts as something else
+    with os.scandir(args.input) as items:
+        for item in items:
+            if item.is_dir():
+                num_directories += 1
+            elif item.is_file():
+                num_files += 1
+                if item.name.endswith('.tab') and not item.name.startswith('.'):
+                    filename = item.name[:-len('.tab')]
+                else:
+                    num_others += 1
             else:
                 num_others += 1
-            num_files += 1
-        elif os.path.isdir(os.path.join(args.input, item)):
-            num_directories += 1
 
     if num_directories > 0 or num_others > 0 or num_files > 1:
         logger.record_event('UNEXPECTED_ITEM_FOUND')
@@ -204,24 +285,24 @@ def main(args):
     #############################################################################################
 
     record_and_display_message(logger, 'Copying system response file into appropriate location.')
-    destination = '{output}/run-out'.format(output=args.output)
-    call_system('mkdir {destination}'.format(destination=destination))
-    call_system('cp -r {input}/{filename}.tab {destination}/{filename}-submitted.tab'.format(input=args.input, filename=filename, destination=destination))
+    destination = f'{args.output}/run-out'
+    os.makedirs(destination, exist_ok=True)
+    call_system(['cp', '-r', f'{args.input}/{filename}.tab', f'{destination}/{filename}-submitted.tab'])
 
     # validate responses
-    validate_command = 'python rufesutils.py validate-responses \
-                         -l {logs_directory}/validate-responses.log \
-                         ./log_specifications.txt \
-                         {data}/segment_boundaries.tab \
-                         {data}/ontology_types.txt \
-                         {destination}/{filename}-submitted.tab \
-                         {destination}/{filename}.tab'
-    call_system(validate_command.format(logs_directory=logs_directory, data=args.data, destination=destination, filename=filename))
+    validate_command = ['python', 'rufesutils.py', 'validate-responses',
+                        '-l', f'{logs_directory}/validate-responses.log',
+                        './log_specifications.txt',
+                        f'{args.data}/segment_boundaries.tab',
+                        f'{args.data}/ontology_types.txt',
+                        f'{destination}/{filename}-submitted.tab',
+                        f'{destination}/{filename}.tab']
+    call_system(validate_command)
 
     num_problems, problem_stats = get_problems(logs_directory)
     if num_problems:
         exit_code = ERROR_EXIT_CODE
-        exit_message = 'Submission format validation error(s) encountered: {} errors'.format(num_problems)
+        exit_message = f'Submission format validation error(s) encountered: {num_problems} errors'
         record_and_display_message(logger, exit_message)
         exit(exit_code)
 
@@ -229,56 +310,73 @@ def main(args):
     # Copy gold annotations file into appropriate location and apply coredocs filter
     #############################################################################################
 
-    gold_destination = '/gold'.format(output=args.output)
-    gold_filename =  re.match(r"^(.*?)\.tab$", args.gold).group(1)
+    gold_destination = '/gold'
+    gold_filename = args.gold[:-len('.tab')] if args.gold.endswith('.tab') else args.gold
     record_and_display_message(logger, 'Copying gold annotations file into appropriate location.')
-    destination = '{gold_destination}'.format(gold_destination=gold_destination)
-    call_system('mkdir -p {destination}'.format(destination=destination))
-    call_system('cp -r {data}/{gold_filename}.tab {destination}/{gold_filename}.tab'.format(data=args.data, gold_filename=gold_filename, destination=destination))
+    destination = gold_destination
+    os.makedirs(destination, exist_ok=True)
+    call_system(['cp', '-r', f'{args.data}/{gold_filename}.tab', f'{destination}/{gold_filename}.tab'])
 
     #############################################################################################
     # Generate filtered data
     #############################################################################################
 
     record_and_display_message(logger, 'Generating filtered data.')
-    destination = '{output}'.format(output=args.output)
-    for filter_name in choices:
-
-        filter_destination = '{output}/{filter_name}'.format(output=args.output, filter_name=filter_name)
-        call_system('mkdir {filter_destination}'.format(filter_destination=filter_destination))
-
-        filter_gold_destination = '{gold_destination}/{filter_name}'.format(gold_destination=gold_destination, filter_name=filter_name)
-        call_system('mkdir {filter_gold_destination}'.format(filter_gold_destination=filter_gold_destination))
-
-        call_system('python filter.py {filter_name} {output}/run-out/{filename}.tab {output}/{filter_name}/{filename}.tab'.format(filter_name=filter_name,
-                                                                                                                                  output=args.output,
-                                                                                                                                  filename=filename))
-        call_system('python filter.py {filter_name} {gold_destination}/{gold_filename}.tab {filter_gold_destination}/{gold_filename}.tab'.format(filter_name=filter_name,
-                                                                                                                                         output=args.output,
-                                                                                                                                         gold_destination=gold_destination,
-                                                                                                                                         filter_gold_destination=filter_gold_destination,
-                                                                                                                                         gold_filename=gold_filename))
-        call_system('cat {output}/{filter_name}/{filename}.tab | perl genTSV.pl > {output}/{filter_name}/{filename}.combined.tsv'.format(filter_name=filter_name,
-                                                                                                                                output=args.output,
-                                                                                                                                filename=filename))
-        call_system('cat {filter_gold_destination}/{gold_filename}.tab | perl genTSV.pl > {filter_gold_destination}/{gold_filename}.tsv'.format(filter_name=filter_name,
-                                                                                                                                          filter_gold_destination=filter_gold_destination,
-                                                                                                                                          gold_filename=gold_filename))
+
+    def generate_filtered_data(filter_name):
+        filter_destination = f'{args.output}/{filter_name}'
+        os.makedirs(filter_destination, exist_ok=True)
+
+        filter_gold_destination = f'{gold_destination}/{filter_name}'
+        os.makedirs(filter_gold_destination, exist_ok=True)
+
+        # filter the system responses and the gold annotations with a single process
+        call_system(['python', 'filter.py', filter_name,
+                     f'{args.output}/run-out/{filename}.tab',
+                     f'{filter_destination}/{filename}.tab',
+                     '--pair',
+                     f'{gold_destination}/{gold_filename}.tab',
+                     f'{filter_gold_destination}/{gold_filename}.tab'])
+        generate_tsv(f'{filter_destination}/{filename}.tab',
+                     f'{filter_destination}/{filename}.combined.tsv')
+        generate_tsv(f'{filter_gold_destination}/{gold_filename}.tab',
+                     f'{filter_gold_destination}/{gold_filename}.tsv')
+
+    # the filters are independent of each other, and most of the time is spent
+    # waiting for the commands to finish, so they are run concurrently in threads
+    run_for_all_filters(generate_filtered_data)
 
     #############################################################################################
     # Score filtered data directories 
     #############################################################################################
 
     record_and_display_message(logger, 'Scoring filtered data.')
-    for filter_name in choices:
-        destination = '{output}/{filter_name}'.format(output=args.output, filter_name=filter_name)
-        filter_gold_destination = '{gold_destination}/{filter_name}'.format(gold_destination=gold_destination, filter_name=filter_name)
-        score_command = 'python score_submission.py -l {logs_directory}/{filter_name}.log -r {runid} ./log_specifications.txt {filter_gold_destination}/{gold_filename}.tab {destination}/{filename}.tab {destination}/typing'
-        call_system(score_command.format(logs_directory=logs_directory, filter_name=filter_name, runid=args.run, filter_gold_destination=filter_gold_destination, gold_filename=gold_filename, destination=destination, filename=filename))
-
-        score_command = "neleval evaluate -m strong_mention_match -m strong_typed_mention_match -m mention_ceaf  -m typed_mention_ceaf -m entity_ceaf -m b_cubed -m muc -m pairwise -f 'tab' "
-        score_command += "-g {filter_gold_destination}/{gold_filename}.tsv {destination}/{filename}.combined.tsv > {destination}/{filename}.evaluation"
-        call_system(score_command.format(filter_gold_destination=filter_gold_destination, gold_filename=gold_filename, destination=destination, filename=filename))
+
+    # the filters are scored concurrently, and each scorer runs worker processes of
+    # its own, so the CPUs are shared out between the scorers
+    workers = max(1, (os.cpu_count() or 1) // len(choices))
+
+    def score_filtered_data(filter_name):
+        destination = f'{args.output}/{filter_name}'
+        filter_gold_destination = f'{gold_destination}/{filter_name}'
+        score_command = ['python', 'score_submission.py',
+                         '-l', f'{logs_directory}/{filter_name}.log',
+                         '-r', args.run,
+                         '-w', str(workers),
+                         './log_specifications.txt',
+                         f'{filter_gold_destination}/{gold_filename}.tab',
+                         f'{destination}/{filename}.tab',
+                         f'{destination}/typing']
+        call_system(score_command)
+
+        score_command = ['neleval', 'evaluate',
+                         '-m', 'strong_mention_match', '-m', 'strong_typed_mention_match', '-m', 'mention_ceaf', '-m', 'typed_mention_ceaf',
+                         '-m', 'entity_ceaf', '-m', 'b_cubed', '-m', 'muc', '-m', 'pairwise', '-f', 'tab',
+                         '-g', f'{filter_gold_destination}/{gold_filename}.tsv',
+                         f'{destination}/{filename}.combined.tsv']
+        call_system(score_command, stdout=f'{destination}/{filename}.evaluation')
+
+    run_for_all_filters(score_filtered_data)
     generate_results_file_and_exit(logger, logs_directory)
 
 if __name__ == '__main__':
@@ -8,49 +8,123 @@ __version__ = "v2020.0.1"
 __date__    = "2 December 2020"
 
 import argparse
+import collections
+import contextlib
+import csv
+import functools
 import logging
+import logging.handlers
+import multiprocessing
+import operator
 import os
-import re
 import sys
 import traceback
 
-from inspect import currentframe, getouterframes
-from munkres import Munkres
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from scipy.sparse import csr_matrix
 
 ALLOK_EXIT_CODE = 0
 ERROR_EXIT_CODE = 255
 
-def multisort(xs, specs):
-    for key, reverse in reversed(specs):
-        xs.sort(key=lambda x: x.get(key), reverse=reverse)
-    return xs
+# the buffer size used for reading input files
+READ_BUFFER_SIZE = 1 << 20
+
+# the maximum number of method lookups cached per process (see Object.resolve_method)
+RESOLVE_CACHE_SIZE = 1024
+
+# the number of log records buffered before they are written to the log file
+LOG_BUFFER_CAPACITY = 1024
+
+@functools.lru_cache(maxsize=None)
+def expand_type(entity_type):
+    """
+    If the type is:
+        'A.B.C' return ('A', 'A.B', 'A.B.C')
+        'A.B'   return ('A', 'A.B')
+        'A'     return ('A',)
+
+    The result is cached per entity_type.
+    """
+    elements = entity_type.split('.')
+    return tuple(['.'.join(elements[:end_index+1]) for end_index in range(len(elements))])
 
 def expanded_types(entity_types):
-    def expand(entity_type):
-        """
-        If the type is:
-            'A.B.C' return ['A', 'A.B', 'A.B.C']
-            'A.B'   return ['A', 'A.B']
-            'A'     return ['A']
-        """
-        metatype = 'Entity'
-        expanded_types = {}
-        elements = entity_type.split('.')
-        for end_index in range(len(elements)):
-            if metatype != 'Entity' and end_index == 0: continue
-            start_index = 0
-            expanded_type_elements = []
-            while start_index <= end_index:
-                expanded_type_elements.append(elements[start_index])
-                start_index += 1
-            if len(expanded_type_elements):
-                expanded_types['.'.join(expanded_type_elements)] = 1
-        return list(expanded_types.keys())
-    expanded_types = set()
-    for entity_type in entity_types:
-        for expanded_type in expand(entity_type):
-            expanded_types.add(expanded_type)
-    return expanded_types
+    return set().union(*[expand_type(entity_type) for entity_type in entity_types])
+
+@functools.lru_cache(maxsize=None)
+def expanded_entity_types(entity_types):
+    """
+    Returns the tuple of expanded types of entity_types, the ';'-separated types
+    as found in the entity_types column, in the order of expanded_types.
+
+    The result is cached per entity_types.
+    """
+    return tuple(expanded_types(entity_types.split(';')))
+
+# the expanded entity types are interned to integer IDs, i.e. their positions in TYPE_NAMES
+TYPE_IDS = {}
+TYPE_NAMES = []
+
+# the types asserted by the entries of a cluster, stored as two parallel arrays holding
+# the ID of each expanded type asserted by each entry and the weight of that entry
+ClusterTypes = collections.namedtuple('ClusterTypes', ['type_ids', 'weights'])
+
+@functools.lru_cache(maxsize=None)
+def expanded_entity_type_ids(entity_types):
+    """
+    Returns the tuple of IDs of the expanded types of entity_types, the ';'-separated
+    types as found in the entity_types column.
+
+    The result is cached per entity_types.
+    """
+    type_ids = []
+    for entity_type in expanded_entity_types(entity_types):
+        if entity_type not in TYPE_IDS:
+            TYPE_IDS[entity_type] = len(TYPE_NAMES)
+            TYPE_NAMES.append(entity_type)
+        type_ids.append(TYPE_IDS[entity_type])
+    return tuple(type_ids)
+
+def get_cluster_types(entries, entry_weights):
+    """
+    Returns the ClusterTypes of the cluster made up of entries, where entry_weights is
+    the array holding the weight of each entry.
+    """
+    type_ids = []
+    counts = []
+    for entry in entries:
+        entry_type_ids = expanded_entity_type_ids(entry.get('entity_types'))
+        type_ids.extend(entry_type_ids)
+        counts.append(len(entry_type_ids))
+    return ClusterTypes(np.array(type_ids, dtype=np.intp), np.repeat(entry_weights, counts))
+
+@functools.lru_cache(maxsize=100000)
+def rank_types(gold_type_ids, system_type_weights):
+    """
+    Rank the system types, given as a tuple of (type_id, weight) pairs, by decreasing
+    weight (ties broken by the type), check them against the gold types, given as a
+    tuple of unique type IDs, and return the tuple:
+        (ranked_type_ids, is_right, num_corrects, sum_precisions, average_precision)
+    where all but the last are tuples holding a value for each rank.
+
+    Clusters asserting the same types with the same weights are common, so the
+    results are cached.
+    """
+    ranked_type_weights = sorted(system_type_weights, key=lambda type_weight: (-type_weight[1], TYPE_NAMES[type_weight[0]]))
+    # the gold types are marked once in an array indexed by type ID, against which
+    # the ranked system types are then checked all at once
+    is_gold_type = np.zeros(len(TYPE_NAMES), dtype=bool)
+    is_gold_type[list(gold_type_ids)] = True
+    ranked_type_ids = np.array([type_id for type_id, _ in ranked_type_weights], dtype=np.intp)
+    is_right = is_gold_type[ranked_type_ids]
+    ranks = np.arange(1, len(ranked_type_ids) + 1)
+    num_corrects = np.cumsum(is_right)
+    sum_precisions = np.cumsum(np.where(is_right, num_corrects / ranks, 0.0))
+    sum_precision = sum_precisions[-1].item() if len(sum_precisions) else 0.0
+    average_precision = sum_precision/len(gold_type_ids)
+    return tuple(ranked_type_ids.tolist()), tuple(is_right.tolist()), tuple(num_corrects.tolist()), tuple(sum_precisions.tolist()), average_precision
 
 def parse_entries(entries, cluster_id_columnname):
         parsed_entries = {}
@@ -64,6 +138,202 @@ def parse_entries(entries, cluster_id_columnname):
             parsed_entries[document_id][entity_id].append(entry)
         return parsed_entries
 
+# the scratch buffer holding the cost matrix of the document being aligned, reused
+# by all the documents aligned by a process (see get_cost_buffer)
+COST_BUFFER = np.empty(1 << 16, dtype=np.float64)
+
+def get_cost_buffer(size):
+    """
+    Returns COST_BUFFER, grown first if it holds less than size elements.
+    """
+    global COST_BUFFER
+    if COST_BUFFER.size < size:
+        COST_BUFFER = np.empty(max(size, 2 * COST_BUFFER.size), dtype=np.float64)
+    return COST_BUFFER
+
+def munkres_assignment(cost_matrix, num_columns):
+    """
+    Solve the assignment problem for the square cost_matrix, whose columns from
+    num_columns on are padding, and return the list of the (row, column) pairs
+    assigned with column < num_columns, in row order.
+
+    This goes through the steps of the Munkres algorithm exactly as the munkres
+    package (1.x) that the scorer was written against does, making the same choice
+    at every step, so that ties between equally good assignments are broken as they
+    always were (other solvers, including later versions of munkres, pick different
+    assignments on ties, which changes the scores). The steps are vectorized over
+    the matrix, which is reduced in place.
+    """
+    n = len(cost_matrix)
+    positions = np.arange(n)
+    starred = np.zeros((n, n), dtype=bool)
+    primed = np.zeros((n, n), dtype=bool)
+    row_covered = np.zeros(n, dtype=bool)
+    column_covered = np.zeros(n, dtype=bool)
+    # step 1: subtract the smallest value of each row from the row
+    cost_matrix -= cost_matrix.min(axis=1)[:, np.newaxis]
+    # step 2: star the first zero of each row unless its column has a star already
+    for row in range(n):
+        columns = np.flatnonzero((cost_matrix[row] == 0) & ~column_covered)
+        if len(columns):
+            starred[row, columns[0]] = True
+            column_covered[columns[0]] = True
+    while True:
+        # step 3: cover the columns holding a star; once all are covered the stars
+        # make up the assignment
+        column_covered = starred.any(axis=0)
+        if column_covered.all():
+            break
+        # step 4: prime uncovered zeros until one has no star in its row; each search
+        # goes through the rows from the one last primed on (wrapping around), and
+        # takes the last uncovered zero of the first row having any, going through
+        # the columns from the one last visited on (wrapping around)
+        row, column = 0, 0
+        while True:
+            zeros = (cost_matrix == 0) & ~row_covered[:, np.newaxis] & ~column_covered
+            rows = np.roll(positions, -row)
+            rows = rows[zeros[rows].any(axis=1)]
+            if not len(rows):
+                # step 6: make a new zero out of the smallest uncovered value, and
+                # search again from the start
+                smallest = cost_matrix[~row_covered][:, ~column_covered].min()
+                cost_matrix[row_covered] += smallest
+                cost_matrix[:, ~column_covered] -= smallest
+                row, column = 0, 0
+                continue
+            row = rows[0]
+            columns = np.roll(positions, -column)
+            column = columns[zeros[row, columns]][-1]
+            primed[row, column] = True
+            star_columns = np.flatnonzero(starred[row])
+            if not len(star_columns):
+                break
+            column = star_columns[0]
+            row_covered[row] = True
+            column_covered[column] = False
+        # step 5: swap the stars and primes along the path alternating between the
+        # primed zero found, the star in its column, the prime in the row of that
+        # star, and so on
+        path = [(row, column)]
+        while True:
+            star_rows = np.flatnonzero(starred[:, path[-1][1]])
+            if not len(star_rows):
+                break
+            path.append((star_rows[0], path[-1][1]))
+            path.append((star_rows[0], np.flatnonzero(primed[star_rows[0]])[0]))
+        for row, column in path:
+            starred[row, column] = not starred[row, column]
+        row_covered[:] = False
+        primed[:] = False
+    return [(row, column) for row, column in zip(*np.nonzero(starred)) if column < num_columns]
+
+def align_document(gold_clusters, system_clusters):
+    """
+    Align the gold and system clusters of a document, each given as a list of
+    (entity_id, mention_spans) pairs, and return the tuple (alignment, similarities)
+    where:
+        alignment is a dictionary with keys 'gold_to_system' and 'system_to_gold', and
+        similarities is the list of (gold_entity_id, system_entity_id, similarity, common_mentions)
+        for each pair of clusters sharing at least one mention.
+    """
+    def get_cost_matrix(similarities, mappings):
+        gold_id_to_index = mappings['gold']['id_to_index']
+        system_id_to_index = mappings['system']['id_to_index']
+        # the (nonzero) similarities are flattened into parallel arrays of gold indices,
+        # system indices and values which are then written into the matrix at once
+        triples = [(gold_id_to_index[gold_id], system_id_to_index[system_id], similarity)
+                   for gold_id in similarities for system_id, similarity in similarities[gold_id].items()]
+        gold_indices, system_indices, values = [np.array(column) for column in zip(*triples)]
+        max_similarity = values.max()
+        # as when it was handed over to munkres, the matrix is transposed if there are
+        # fewer gold than system clusters, so that it has at least as many rows as
+        # columns, and is then padded with columns of zeros into a square matrix, which
+        # is laid out at the start of the scratch buffer
+        num_gold, num_system = len(gold_id_to_index), len(system_id_to_index)
+        is_transposed = num_gold < num_system
+        if is_transposed:
+            row_indices, column_indices, num_rows, num_columns = system_indices, gold_indices, num_system, num_gold
+        else:
+            row_indices, column_indices, num_rows, num_columns = gold_indices, system_indices, num_gold, num_system
+        cost_matrix = get_cost_buffer(num_rows * num_rows)[:num_rows * num_rows].reshape(num_rows, num_rows)
+        cost_matrix[:, :num_columns] = max_similarity
+        cost_matrix[:, num_columns:] = 0
+        cost_matrix[row_indices, column_indices] = max_similarity - values
+        return is_transposed, cost_matrix, num_columns
+    def get_alignment(similarities, mappings):
+        alignment = {'gold_to_system': {}, 'system_to_gold': {}}
+        if len(similarities) > 0:
+            is_transposed, cost_matrix, num_columns = get_cost_matrix(similarities, mappings)
+            for row_index, column_index in munkres_assignment(cost_matrix, num_columns):
+                if is_transposed:
+                    gold_entity_index, system_entity_index = column_index, row_index
+                else:
+                    gold_entity_index, system_entity_index = row_index, column_index
+                gold_entity_id = mappings['gold']['index_to_id'][gold_entity_index]
+                system_entity_id = mappings['system']['index_to_id'][system_entity_index]
+                similarity = similarities.get(gold_entity_id, {}).get(system_entity_id, 0)
+                if similarity > 0:
+                    alignment.get('gold_to_system')[gold_entity_id] = {
+                            'aligned_to': system_entity_id,
+                            'aligned_similarity': similarity
+                        }
+                    alignment.get('system_to_gold')[system_entity_id] = {
+                            'aligned_to': gold_entity_id,
+                            'aligned_similarity': similarity
+                        }
+        return alignment
+    data = {
+        'gold': gold_clusters,
+        'system': system_clusters
+        }
+    # intern the mention spans to integer IDs so that the number of mentions
+    # shared by every pair of gold and system clusters comes out of a single
+    # product of the (sparse) cluster-by-span incidence matrices
+    span_ids = {}
+    mention_spans = {}
+    for gold_or_system in ['gold', 'system']:
+        mention_spans[gold_or_system] = [frozenset(spans) for _, spans in data[gold_or_system]]
+        for spans in mention_spans[gold_or_system]:
+            for span in spans:
+                span_ids.setdefault(span, len(span_ids))
+    incidence = {}
+    for gold_or_system in ['gold', 'system']:
+        # the span IDs of all clusters are packed one after the other, with offsets
+        # marking where each cluster begins, which is the layout of a CSR matrix
+        offsets = np.zeros(len(mention_spans[gold_or_system]) + 1, dtype=np.int32)
+        offsets[1:] = np.cumsum([len(spans) for spans in mention_spans[gold_or_system]])
+        ids = np.fromiter((span_ids[span] for spans in mention_spans[gold_or_system] for span in spans), dtype=np.int32, count=offsets[-1])
+        incidence[gold_or_system] = csr_matrix((np.ones(len(ids), dtype=np.int32), ids, offsets),
+                                               shape=(len(mention_spans[gold_or_system]), len(span_ids)))
+    similarity_matrix = (incidence['gold'] @ incidence['system'].T).tocsr()
+    similarity_matrix.sort_indices()
+    # only the nonzero similarities are recorded
+    similarities = collections.defaultdict(dict)
+    similarity_list = []
+    gold_entity_ids = [entity_id for entity_id, _ in data['gold']]
+    system_entity_ids = [entity_id for entity_id, _ in data['system']]
+    offsets, system_indices, values = similarity_matrix.indptr, similarity_matrix.indices, similarity_matrix.data
+    for gold_index, gold_entity_id in enumerate(gold_entity_ids):
+        for position in range(offsets[gold_index], offsets[gold_index+1]):
+            similarity = int(values[position])
+            if not similarity:
+                continue
+            system_index = system_indices[position]
+            system_entity_id = system_entity_ids[system_index]
+            similarities[gold_entity_id][system_entity_id] = similarity
+            common_mentions = mention_spans['gold'][gold_index] & mention_spans['system'][system_index]
+            similarity_list.append((gold_entity_id, system_entity_id, similarity, ';'.join(common_mentions)))
+    mappings = {}
+    for gold_or_system, entity_ids in [('gold', gold_entity_ids), ('system', system_entity_ids)]:
+        # the IDs are indexed in sorted order (rather than in the order they were read)
+        # so that ties between equally good alignments are broken independently of the
+        # order of the lines in the input files; the indices being consecutive, the
+        # sorted list itself maps index to ID
+        index_to_id = sorted(entity_ids)
+        mappings[gold_or_system] = {'id_to_index': {entity_id: index for index, entity_id in enumerate(index_to_id)},
+                                    'index_to_id': index_to_id}
+    return get_alignment(similarities, mappings), similarity_list
+
 class Object(object):
     """
     This class represents an AIDA object which is envisioned to be the parent of most of the AIDA related classes.
@@ -71,6 +341,8 @@ class Object(object):
     At a high level this class is a wrapper around a single dictionary object which provides support for complex getters.
     """
 
+    __slots__ = ('logger',)
+
     def __init__(self, logger):
         """
         Initializes this instance, and sets the logger for newly created instance.
@@ -93,10 +365,10 @@ class Object(object):
         key = args[0]
         if key is None:
             self.get('logger').record_event('KEY_IS_NONE', self.get('code_location'))
-        method = self.get_method("get_{}".format(key))
-        if method is not None:
+        getter = type(self).resolve_getter(key)
+        if getter is not None:
             args = args[1:]
-            return method(*args, **kwargs)
+            return getter(self, *args, **kwargs)
         else:
             value = getattr(self, key, None)
             return value
@@ -106,13 +378,32 @@ class Object(object):
         Returns the method whose name matches the value stored in method_name,
         None otherwise.
         """
-        try:
-            method = getattr(self, method_name)
-            if not hasattr(method, "__call__"):
-                raise AttributeError()
-        except AttributeError:
-            method = None
-        return method
+        if type(self).resolve_method(method_name) is None:
+            return
+        return getattr(self, method_name)
+
+    @classmethod
+    @functools.lru_cache(maxsize=RESOLVE_CACHE_SIZE)
+    def resolve_method(cls, method_name):
+        """
+        Returns the function, defined by the class, whose name matches the value
+        stored in method_name, None otherwise.
+
+        The result is cached per class and method_name. The cache is bounded as
+        the names looked up through resolve_getter are made from whatever keys
+        are passed to Object.get, which include data keys (e.g. document IDs).
+        """
+        method = getattr(cls, method_name, None)
+        return method if callable(method) else None
+
+    @classmethod
+    def resolve_getter(cls, key):
+        """
+        Returns the function get_{key} defined by the class, None otherwise.
+
+        The lookup is cached by resolve_method.
+        """
+        return cls.resolve_method("get_{}".format(key))
     
     def get_code_location(self):
         """
@@ -124,8 +415,9 @@ class Object(object):
             filename
             lineno
         """
-        caller_frame_info = getouterframes(currentframe(), 2)[2]
-        where = {'filename': caller_frame_info.filename, 'lineno': caller_frame_info.lineno}
+        # skip this frame and that of Object.get through which this method is called
+        caller_frame = sys._getframe(2)
+        where = {'filename': caller_frame.f_code.co_filename, 'lineno': caller_frame.f_lineno}
         return where
 
     def record_event(self, event_code, *args):
@@ -151,6 +443,10 @@ class Container(Object):
     The container class.
 
     Internally, the instance of this class stores objects in a dictionary.
+
+    As long as values are only added without a key (i.e. keyed by their position),
+    the store is a list; it is converted into a dictionary when the first value is
+    added with a key.
     """
 
     def __init__(self, logger):
@@ -168,9 +464,9 @@ class Container(Object):
 
     def __iter__(self):
         """
-        Returns the iterator over the store.
+        Returns the iterator over the store's keys.
         """
-        return iter(self.store)
+        return iter(self.keys())
 
     def get(self, *args, **kwargs):
         """
@@ -180,13 +476,18 @@ class Container(Object):
         the value is looked up in the store, again returned if found. Otherwise, the
         key is added, to the store, with its value set to the default value provided
         or None, if no default value was provided.
+
+        NOTE: As a shortcut, a key found in the store, when no other arguments are
+        given, is returned from the store without looking it up in the parent object.
         """
         key = args[0]
+        if len(args) == 1 and not kwargs and self.exists(key):
+            return self.store[key]
         default = kwargs['default'] if 'default' in kwargs else None
         value = super().get(*args, **kwargs)
         if value:
             return value
-        elif key in self.store:
+        elif self.exists(key):
             return self.store[key]
         else:
             if value is None and default is not None:
@@ -199,7 +500,7 @@ class Container(Object):
         Sets the value of the key in the store if key is found in the store, otherwise,
         the object's setter is called.
         """
-        if key in self.store:
+        if self.exists(key):
             self.store[key] = value
         else:
             super().set(key, value)
@@ -208,17 +509,28 @@ class Container(Object):
         """
         Returns True if key is found in the store, False otherwise.
         """
-        return key in self.store
+        store = self.store
+        if isinstance(store, list):
+            return isinstance(key, int) and 0 <= key < len(store)
+        return key in store
 
     def add(self, value, key=None):
         """
         Adds the value to the store and map it to the key if provided, otherwise,
         use the length of the store as the key.
         """
+        store = self.store
         if key is None:
-            self.store[len(self.store)] = value
+            if isinstance(store, list):
+                store.append(value)
+            elif not store:
+                self.store = [value]
+            else:
+                store[len(store)] = value
         else:
-            self.store[key] = value
+            if isinstance(store, list):
+                store = self.store = dict(enumerate(store))
+            store[key] = value
 
     def add_member(self, member):
         """
@@ -234,19 +546,31 @@ class Container(Object):
         """
         Returns a new view of the store's keys.
         """
-        return self.store.keys()
+        store = self.store
+        if isinstance(store, list):
+            return range(len(store))
+        return store.keys()
 
     def values(self):
         """
         Returns a new view of the store's values.
         """
-        return self.store.values()
+        store = self.store
+        if isinstance(store, list):
+            return store
+        return store.values()
 
 class Entry(Object):
     """
     The Entry represents a line in a tab separated file.
+
+    The entries of a file are instances of a subclass of Entry, returned by
+    Entry.for_columns, which keeps the values of the columns in slots.
     """
 
+    # __dict__ is kept so that Entry itself can hold any column
+    __slots__ = ('where', 'header', '__dict__')
+
     def __init__(self, logger, keys, values, where):
         """
         Initializes this instance.
@@ -269,8 +593,22 @@ class Entry(Object):
         if len(keys) != len(values):
             logger.record_event('UNEXPECTED_NUM_COLUMNS', len(keys), len(values), where)
         self.where = where
-        for i in range(len(keys)):
-            self.set(keys[i], values[i].strip())
+        for key, value in zip(keys, values):
+            setattr(self, key, value.strip())
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def for_columns(cls, columns):
+        """
+        Returns the subclass of Entry that stores the values of columns (a tuple of
+        str) in slots, or Entry itself if the columns cannot be used as slot names.
+
+        The result is cached per columns.
+        """
+        slots = cls.__slots__ + ('logger',)
+        if len(set(columns)) != len(columns) or not all(column.isidentifier() and column not in slots for column in columns):
+            return cls
+        return type(cls.__name__, (cls,), {'__slots__': columns})
 
     def get_filename(self):
         """
@@ -284,8 +622,17 @@ class Entry(Object):
         """
         return self.get('where').get('lineno')
 
+    def get_line(self):
+        """
+        Gets the line which this instance corresponds to.
+
+        NOTE: The line is reconstructed from the (stripped) values of the entry.
+        """
+        return self.__str__()
+
     def __str__(self):
-        return '{}\n'.format('\t'.join([self.get(column) for column in self.get('schema').get('columns')]))
+        # the values are read directly from the attributes named by the header columns
+        return '{}\n'.format('\t'.join([getattr(self, column, '') for column in self.header.columns]))
 
 class FileHandler(Object):
     """
@@ -319,18 +666,31 @@ class FileHandler(Object):
         """
         Load the file.
         """
-        with open(self.get('filename'), encoding=self.get('encoding')) as file:
-            for lineno, line in enumerate(file, start=1):
-                if self.get('header') is None:
-                    self.header = FileHeader(self.get('logger'), line.rstrip())
-                else:
-                    where = {'filename': self.get('filename'), 'lineno': lineno}
-                    entry = Entry(self.get('logger'), self.get('header').get('columns'),
-                                   line.rstrip('\r\n').split('\t', len(self.get('header').get('columns'))-1), where)
-                    entry.set('where', where)
-                    entry.set('header', self.get('header'))
-                    entry.set('line', line)
-                    self.get('entries').append(entry)
+        filename = self.filename
+        logger = self.logger
+        entries = self.entries
+        with open(filename, encoding=self.encoding, buffering=READ_BUFFER_SIZE, newline='') as file:
+            # the lines are split into values by the (C implemented) csv.reader
+            reader = csv.reader(file, delimiter='\t', quoting=csv.QUOTE_NONE)
+            numbered_rows = enumerate(reader, start=1)
+            if self.header is None:
+                first = next(numbered_rows, None)
+                if first is None:
+                    return
+                self.header = FileHeader(logger, '\t'.join(first[1]).rstrip())
+            header = self.header
+            columns = header.columns
+            num_columns = len(columns)
+            entry_class = Entry.for_columns(tuple(columns))
+            for lineno, values in numbered_rows:
+                if len(values) > num_columns:
+                    # the last column gets the remainder of the line
+                    values[num_columns-1:] = ['\t'.join(values[num_columns-1:])]
+                elif not values:
+                    values = ['']
+                entry = entry_class(logger, columns, values, {'filename': filename, 'lineno': lineno})
+                entry.header = header
+                entries.append(entry)
     
     def __iter__(self):
         """
@@ -356,7 +716,7 @@ class FileHeader(Object):
         super().__init__(logger)
         self.logger = logger
         self.line = header_line
-        self.columns = list(re.split(r'\t', header_line))
+        self.columns = header_line.split('\t')
     
     def __str__(self, *args, **kwargs):
         """
@@ -410,6 +770,13 @@ class Logger:
         self.script_codename = self.file_name
         self.debug_level = debug_level
         self.logger_object = logging.getLogger(self.file_name)
+        # the logger methods used for recording events of type other than CRITICAL
+        self.log_methods = {
+            'DEBUG': self.logger_object.debug,
+            'ERROR': self.logger_object.error,
+            'INFO': self.logger_object.info,
+            'WARNING': self.logger_object.warning,
+            }
         self.configure_logger()
         self.record_program_invokation()
         self.load_event_specs()
@@ -419,11 +786,16 @@ class Logger:
         Set the output file of the logger, the debug level, format of log output, and
         format of date and time in log output.
         """
-        logging.basicConfig(filename=self.log_filename, 
-                            encoding='utf-8',
-                            level=self.debug_level,
-                            format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                            datefmt='%m/%d/%Y %I:%M:%S %p')
+        file_handler = logging.FileHandler(self.log_filename, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter(fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                                                    datefmt='%m/%d/%Y %I:%M:%S %p'))
+        # records are written to the file in batches; an error, or exiting, writes
+        # out what has been buffered so far
+        memory_handler = logging.handlers.MemoryHandler(LOG_BUFFER_CAPACITY,
+                                                        flushLevel=logging.ERROR,
+                                                        target=file_handler)
+        logging.basicConfig(handlers=[memory_handler],
+                            level=self.debug_level)
     
     def get_logger(self):
         """
@@ -458,7 +830,10 @@ class Logger:
         header = lines[0].strip().split(None, 2)
         for line in lines[1:]:
             line_dict = dict(zip(header, line.strip().split(None, 2)))
-            self.event_specs[line_dict['code']] = line_dict
+            # keep the upper-cased type, and the bound format method of the message template
+            line_dict['level'] = line_dict['type'].upper()
+            line_dict['format'] = line_dict['message'].format
+            self.event_specs[sys.intern(line_dict['code'])] = line_dict
 
     def record_event(self, event_code, *args):
         """
@@ -483,40 +858,87 @@ class Logger:
         MESSAGE is the message written to the log file. It has zero or more arguments to be filled 
         by ARG1, ARG2, ...
         """
-        argslst = []
-        where = None
-        if len(args):
-            argslst = list(args)
-            if isinstance(argslst[-1], dict):
-                where = argslst.pop()
-        if event_code in self.event_specs:
-            event_object = self.event_specs[event_code]
-            event_type = event_object['type']
-            event_message = event_object['message'].format(*argslst)
-            event_message = '{code} - {message}'.format(code=event_code, message=event_message)
-            if where is not None:
-                event_message += " at " + where['filename'] + ":" + str(where['lineno'])
-            if event_type.upper() == "CRITICAL":
-                self.logger_object.critical(event_message + "\n" + "".join(traceback.format_stack()))
-                sys.exit(event_message + "\n" + "".join(traceback.format_stack()))
-            elif event_type.upper() == "DEBUG":
-                self.logger_object.debug(event_message)
-            elif event_type.upper() == "ERROR":
-                self.logger_object.error(event_message)
-                self.num_errors = self.num_errors + 1
-            elif event_type.upper() == "INFO":
-                self.logger_object.info(event_message)
-            elif event_type.upper() == "WARNING":
-                self.logger_object.warning(event_message)
-                self.num_warnings = self.num_warnings + 1
-            else:
-                error_message = "Unknown event type '" + event_type + "' for event: " + event_code
-                self.logger_object.error(error_message + "\n" + "".join(traceback.format_stack()))
-                sys.exit(error_message + "\n" + "".join(traceback.format_stack()))
-        else:
+        event_object = self.event_specs.get(event_code)
+        if event_object is None:
             error_message = "Unknown log event: " + event_code
             self.logger_object.error(error_message + "\n" + "".join(traceback.format_stack()))
             sys.exit(error_message + "\n" + "".join(traceback.format_stack()))
+        event_type = event_object['level']
+        if not self.is_recorded(event_type):
+            return
+        event_message = self.get_event_message(event_code, event_object, args)
+        if event_type == "CRITICAL":
+            stack = "".join(traceback.format_stack())
+            self.logger_object.critical(event_message + "\n" + stack)
+            sys.exit(event_message + "\n" + stack)
+        elif event_type in self.log_methods:
+            self.log_methods[event_type](event_message)
+            if event_type == "ERROR":
+                self.num_errors = self.num_errors + 1
+            elif event_type == "WARNING":
+                self.num_warnings = self.num_warnings + 1
+        else:
+            error_message = "Unknown event type '" + event_object['type'] + "' for event: " + event_code
+            stack = "".join(traceback.format_stack())
+            self.logger_object.error(error_message + "\n" + stack)
+            sys.exit(error_message + "\n" + stack)
+
+    def record_events(self, event_code, argslsts):
+        """
+        Record an event once for each list of arguments in argslsts.
+
+        This is the same as calling record_event(event_code, *args) for each args
+        in argslsts, except that the event specification is looked up once, and
+        the events that are neither CRITICAL nor counted (i.e. DEBUG and INFO) are
+        handed over to the logger without going through record_event.
+        """
+        event_object = self.event_specs.get(event_code)
+        event_type = event_object['level'] if event_object is not None else None
+        if event_type not in ('DEBUG', 'INFO'):
+            for args in argslsts:
+                self.record_event(event_code, *args)
+            return
+        if not self.is_recorded(event_type):
+            return
+        log = self.log_methods[event_type]
+        for args in argslsts:
+            log(self.get_event_message(event_code, event_object, args))
+
+    def is_enabled(self, event_code):
+        """
+        Returns False if the event event_code would be dropped by the logger, True
+        otherwise (including when event_code is unknown, so that recording it fails
+        as it would otherwise).
+
+        Used for skipping the work of preparing the arguments of events that are
+        not going to be recorded.
+        """
+        event_object = self.event_specs.get(event_code)
+        return event_object is None or self.is_recorded(event_object['level'])
+
+    def is_recorded(self, event_type):
+        """
+        Returns False if the event of type event_type would be dropped by the logger,
+        True otherwise.
+
+        NOTE: Only DEBUG and INFO events are ever dropped; the others are counted or
+        terminate the program.
+        """
+        if event_type in ('DEBUG', 'INFO'):
+            return self.logger_object.isEnabledFor(getattr(logging, event_type))
+        return True
+
+    def get_event_message(self, event_code, event_object, args):
+        """
+        Returns the message of the event given its code, the event object and the
+        arguments passed to record_event.
+        """
+        argslst = list(args)
+        where = argslst.pop() if len(argslst) and isinstance(argslst[-1], dict) else None
+        event_message = '{code} - {message}'.format(code=event_code, message=event_object['format'](*argslst))
+        if where is not None:
+            event_message += " at " + where['filename'] + ":" + str(where['lineno'])
+        return event_message
 
     def record_program_invokation(self):
         """
@@ -525,14 +947,48 @@ class Logger:
         debug_message = "Execution begins {current_dir:" + self.path_name + ", script_name:" + self.file_name + ", arguments:" + self.arguments +"}"
         self.logger_object.info(debug_message)
 
+class EventRecorder:
+    """
+    A stand-in for the Logger, used in worker processes, which keeps the events
+    instead of logging them so that they can be recorded by the Logger of the
+    parent process.
+
+    The events are kept as a list of (event_code, argslsts) pairs, in the order in
+    which they were recorded.
+
+    An event upon which the Logger exits (i.e. one that is CRITICAL, or unknown)
+    raises EventRecorder.FatalEvent once kept, so that the worker stops right away.
+    """
+
+    class FatalEvent(Exception):
+        pass
+
+    def __init__(self, disabled_event_codes, nonfatal_event_codes):
+        self.disabled_event_codes = disabled_event_codes
+        self.nonfatal_event_codes = nonfatal_event_codes
+        self.events = []
+
+    def record_event(self, event_code, *args):
+        self.record_events(event_code, [args])
+
+    def record_events(self, event_code, argslsts):
+        argslsts = list(argslsts)
+        self.events.append((event_code, argslsts))
+        if argslsts and event_code not in self.nonfatal_event_codes:
+            raise EventRecorder.FatalEvent(event_code)
+
+    def is_enabled(self, event_code):
+        return event_code not in self.disabled_event_codes
+
 class Alignment(Object):
     """
     Class for performing alignment, and supporting lookup.
     """
 
-    def __init__(self, logger, gold, system, cluster_by_columnname):
+    def __init__(self, logger, gold, system, cluster_by_columnname, workers=None):
         super().__init__(logger)
         self.cluster_by_columnname = cluster_by_columnname
+        self.workers = workers
         self.gold = gold
         self.system = system
         self.document_alignment = {}
@@ -542,105 +998,31 @@ class Alignment(Object):
         return(parse_entries(entries, self.get('cluster_by_columnname')))
 
     def align_clusters(self):
-        def get_max_similarity(similarities):
-            max_similarity = -1 * sys.maxsize
-            for i in similarities:
-                for j in similarities[i]:
-                    if similarities[i][j] > max_similarity:
-                        max_similarity = similarities[i][j]
-            return max_similarity
-        def get_cost_matrix(similarities, mappings):
-            def conditional_transpose(cost_matrix):
-                m = {}
-                rm = {}
-                row_index = 0
-                col_index = 0
-                is_transposed = False
-                for row in cost_matrix:
-                    row_index = 0
-                    for value in row:
-                        if row_index not in m:
-                            m[row_index] = {}
-                        m[row_index][col_index] = value
-                        row_index += 1
-                    col_index += 1
-                if col_index >= row_index:
-                    return is_transposed, cost_matrix
-                else:
-                    is_transposed = True
-                    transposed_matrix = []
-                    for row_index in sorted(m):
-                        transposed_matrix_row = []
-                        for col_index in sorted(m[row_index]):
-                            transposed_matrix_row += [m[row_index][col_index]]
-                        transposed_matrix += [transposed_matrix_row]
-                    return is_transposed, transposed_matrix
-            max_similarity = get_max_similarity(similarities)
-            cost_matrix = []
-            for gold_index in sorted(mappings['gold']['index_to_id']):
-                cost_row = []
-                gold_id = mappings['gold']['index_to_id'][gold_index]
-                for system_index in sorted(mappings['system']['index_to_id']):
-                    system_id = mappings['system']['index_to_id'][system_index]
-                    similarity = 0
-                    if gold_id in similarities and system_id in similarities[gold_id]:
-                        similarity = similarities[gold_id][system_id]
-                    cost_row += [max_similarity - similarity]
-                cost_matrix += [cost_row]
-            return conditional_transpose(cost_matrix)
-        def get_alignment(similarities, mappings):
-            alignment = {'gold_to_system': {}, 'system_to_gold': {}}
-            if len(similarities) > 0:
-                is_transposed, cost_matrix = get_cost_matrix(similarities, mappings)
-                for gold_entity_index, system_entity_index in Munkres().compute(cost_matrix):
-                    if is_transposed:
-                        temp = gold_entity_index
-                        gold_entity_index = system_entity_index
-                        system_entity_index = temp
-                    gold_entity_id = mappings['gold']['index_to_id'][gold_entity_index]
-                    system_entity_id = mappings['system']['index_to_id'][system_entity_index]
-                    similarity = similarities[gold_entity_id][system_entity_id]
-                    if similarity > 0:
-                        alignment.get('gold_to_system')[gold_entity_id] = {
-                                'aligned_to': system_entity_id,
-                                'aligned_similarity': similarity
-                            }
-                        alignment.get('system_to_gold')[system_entity_id] = {
-                                'aligned_to': gold_entity_id,
-                                'aligned_similarity': similarity
-                            }
-            return alignment
         annotations = self.get('parsed_entries', self.get('gold').get('entries'))
         responses = self.get('parsed_entries', self.get('system').get('entries'))
         document_alignment = self.get('document_alignment')
-        for document_id in annotations:
-            data = {
-                'gold': annotations.get(document_id),
-                'system': responses.get(document_id, [])
-                }
-            similarities = {}
-            for gold_entity_id in data['gold']:
-                for system_entity_id in data['system']:
-                    if gold_entity_id not in similarities:
-                        similarities[gold_entity_id] = {}
-                    if system_entity_id not in similarities[gold_entity_id]:
-                        similarities[gold_entity_id][system_entity_id] = 0
-                    gold_mention_spans = set([e.get('mention_span') for e in data['gold'][gold_entity_id]])
-                    system_mention_spans = set([e.get('mention_span') for e in data['system'][system_entity_id]])
-                    common_mentions = gold_mention_spans.intersection(system_mention_spans)
-                    similarity = len(common_mentions)
-                    similarities[gold_entity_id][system_entity_id] = similarity
-                    if similarity > 0:
-                        self.record_event('SIMILARITY_INFO', self.__class__.__name__, document_id, gold_entity_id, system_entity_id, similarity, ';'.join(common_mentions))
-            mappings = {}
-            for gold_or_system in ['gold', 'system']:
-                mappings[gold_or_system] = {'id_to_index': {}, 'index_to_id': {}}
-                index = 0;
-                for entity_id in sorted(data[gold_or_system]):
-                    mappings[gold_or_system]['id_to_index'][entity_id] = index
-                    mappings[gold_or_system]['index_to_id'][index] = entity_id
-                    index += 1
-            document_alignment[document_id] = get_alignment(similarities, mappings)
+        logger = self.get('logger')
+        # the entries cannot be sent to other processes, so only the mention spans of
+        # each cluster are handed over to align_document
+        document_ids = list(annotations)
+        clusters = {}
+        for gold_or_system, parsed_entries in [('gold', annotations), ('system', responses)]:
+            clusters[gold_or_system] = [[(entity_id, [e.get('mention_span') for e in entries]) for entity_id, entries in parsed_entries.get(document_id, {}).items()]
+                                        for document_id in document_ids]
+        # the documents are independent of each other so align them in parallel (unless
+        # a single worker is allowed)
+        with contextlib.ExitStack() as stack:
+            if self.get('workers') == 1:
+                results = map(align_document, clusters['gold'], clusters['system'])
+            else:
+                executor = stack.enter_context(ProcessPoolExecutor(max_workers=self.get('workers')))
+                results = executor.map(align_document, clusters['gold'], clusters['system'], chunksize=16)
+            record_similarities = logger.is_enabled('SIMILARITY_INFO')
+            for document_id, (alignment, similarities) in zip(document_ids, results):
+                if record_similarities:
+                    similarity_events = [(self.__class__.__name__, document_id) + similarity for similarity in similarities]
+                    logger.record_events('SIMILARITY_INFO', similarity_events)
+                document_alignment[document_id] = alignment
 
 class Score(Object):
     """
@@ -685,25 +1067,26 @@ class ScorePrinter(Container):
         return self.get_line_text()
 
     def get_line_text(self, line=None):
-        text = ''
-        separator = ''
+        separator = self.separators[self.separator]
+        widths = self.widths
+        texts = []
         for field in self.printing_specs:
-            text += separator
             field_name = field.get('name')
-            value = line.get(field_name) if line is not None else field.get('header')
-            num_spaces = 0 if self.separators[self.get('separator')] is not None else self.widths[field_name] - len(str(value))
-            spaces_prefix = ' ' * num_spaces if field.get('justify') == 'R' and self.separators[self.get('separator')] is None else ''
-            spaces_postfix = ' ' * num_spaces if field.get('justify') == 'L' and self.separators[self.get('separator')] is None else ''
-            text = '{}{}{}{}'.format(text, spaces_prefix, value, spaces_postfix)
-            separator = ' ' if self.separators[self.get('separator')] is None else self.separators[self.get('separator')]
-        return text
+            text = str(line.get(field_name) if line is not None else field.get('header'))
+            if separator is None:
+                # pretty printing pads the text to the width of the column
+                spaces = ' ' * (widths[field_name] - len(text))
+                justify = field.get('justify')
+                if justify == 'R':
+                    text = spaces + text
+                elif justify == 'L':
+                    text = text + spaces
+            texts.append(text)
+        return (' ' if separator is None else separator).join(texts)
     
     def __str__(self):
         self.prepare_lines()
-        string = self.get_header_text()
-        for line in self.get('lines'):
-            string = '{}\n{}'.format(string, self.get_line_text(line))
-        return string
+        return '\n'.join([self.get_header_text()] + [self.get_line_text(line) for line in self.get('lines')])
 
 class Scorer(Object):
     """
@@ -770,85 +1153,47 @@ class ClusterTypesMetricScorerV1(Scorer):
         return 'entity_id'
 
     def get_document_scores(self, document_id, document_annotations, document_responses, document_alignment):
-        def get_max_similarity(similarities):
-            max_similarity = -1 * sys.maxsize
-            for i in similarities:
-                for j in similarities[i]:
-                    if similarities[i][j] > max_similarity:
-                        max_similarity = similarities[i][j]
-            return max_similarity
-
-        def get_cost_matrix(similarities, mappings):
-            def conditional_transpose(cost_matrix):
-                m = {}
-                rm = {}
-                row_index = 0
-                col_index = 0
-                is_transposed = False
-                for row in cost_matrix:
-                    row_index = 0
-                    for value in row:
-                        if row_index not in m:
-                            m[row_index] = {}
-                        m[row_index][col_index] = value
-                        row_index += 1
-                    col_index += 1
-                if col_index >= row_index:
-                    return is_transposed, cost_matrix
-                else:
-                    is_transposed = True
-                    transposed_matrix = []
-                    for row_index in sorted(m):
-                        transposed_matrix_row = []
-                        for col_index in sorted(m[row_index]):
-                            transposed_matrix_row += [m[row_index][col_index]]
-                        transposed_matrix += [transposed_matrix_row]
-                    return is_transposed, transposed_matrix
-            max_similarity = get_max_similarity(similarities)
-            cost_matrix = []
-            for gold_index in sorted(mappings['gold']['index_to_id']):
-                cost_row = []
-                gold_id = mappings['gold']['index_to_id'][gold_index]
-                for system_index in sorted(mappings['system']['index_to_id']):
-                    system_id = mappings['system']['index_to_id'][system_index]
-                    similarity = 0
-                    if gold_id in similarities and system_id in similarities[gold_id]:
-                        similarity = similarities[gold_id][system_id]
-                    cost_row += [max_similarity - similarity]
-                cost_matrix += [cost_row]
-            return conditional_transpose(cost_matrix)
-
         def get_precision_recall_and_f1(relevant, retrieved):
-            precision = len(relevant & retrieved) / len(retrieved) if len(retrieved) else 0
-            recall = len(relevant & retrieved) / len(relevant)
+            # relevant and retrieved are arrays of unique type IDs
+            num_relevant_retrieved = np.intersect1d(relevant, retrieved, assume_unique=True).size
+            precision = num_relevant_retrieved / retrieved.size if retrieved.size else 0
+            recall = num_relevant_retrieved / relevant.size
             f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0
             return precision, recall, f1
 
         def get_type_scores(logger, document_id, gold_entity_id, gold_entries, system_entity_id, system_entries):
-            types = {'gold': set(), 'system': set()}
+            # the scores are computed over the interned type IDs; the type names are
+            # only collected for the log
+            type_ids = {'gold': [], 'system': []}
             entries = {'gold': gold_entries, 'system': system_entries}
             entity_ids = {'gold': gold_entity_id, 'system': system_entity_id}
-            for gold_or_system in types:
+            record_entity_types = logger.is_enabled('ENTITY_TYPES_INFO')
+            for gold_or_system in type_ids:
                 entity_types = set()
+                expanded_types_set = set()
                 for entry in entries[gold_or_system]:
-                    for entity_type in entry.get('entity_types').split(';'):
-                        entity_types.add(entity_type)
-                    for expanded_entity_type in expanded_types(list(entry.get('entity_types').split(';'))):
-                        types[gold_or_system].add(expanded_entity_type)
-                logger.record_event('ENTITY_TYPES_INFO',
-                                    self.__class__.__name__,
-                                    gold_or_system.upper(),
-                                    document_id,
-                                    entity_ids[gold_or_system],
-                                    ';'.join(entity_types),
-                                    ';'.join(types[gold_or_system])
-                                    )
-            return get_precision_recall_and_f1(types['gold'], types['system'])
+                    entry_entity_types = entry.get('entity_types')
+                    if record_entity_types:
+                        entity_types.update(entry_entity_types.split(';'))
+                        expanded_types_set.update(expanded_entity_types(entry_entity_types))
+                    type_ids[gold_or_system].extend(expanded_entity_type_ids(entry_entity_types))
+                if record_entity_types:
+                    logger.record_event('ENTITY_TYPES_INFO',
+                                        self.__class__.__name__,
+                                        gold_or_system.upper(),
+                                        document_id,
+                                        entity_ids[gold_or_system],
+                                        ';'.join(entity_types),
+                                        ';'.join(expanded_types_set)
+                                        )
+            return get_precision_recall_and_f1(np.unique(type_ids['gold']), np.unique(type_ids['system']))
 
+        # the entries of the document, parsed once by score_responses, are passed in
         data = {
-                'gold': self.get('parsed_entries', self.get('gold').get('entries')).get(document_id),
-                'system': self.get('parsed_entries', self.get('system').get('entries')).get(document_id, [])
+                'gold': document_annotations,
+                'system': document_responses
                 }
+        record_alignments = self.get('logger').is_enabled('ALIGNMENT_INFO')
         scores = {}
         for gold_entity_id in data['gold']:
             system_entity_id = 'None'
@@ -857,7 +1202,8 @@ class ClusterTypesMetricScorerV1(Scorer):
                 system_entity_id = document_alignment.get('gold_to_system').get(gold_entity_id).get('aligned_to')
                 similarity = document_alignment.get('gold_to_system').get(gold_entity_id).get('aligned_similarity')
             precision, recall, f1 = 0,0,0
-            self.record_event('ALIGNMENT_INFO', self.__class__.__name__, document_id, gold_entity_id, system_entity_id, similarity)
+            if record_alignments:
+                self.record_event('ALIGNMENT_INFO', self.__class__.__name__, document_id, gold_entity_id, system_entity_id, similarity)
             if system_entity_id != 'None':
                 precision, recall, f1 = get_type_scores(self.get('logger'),
                                                         document_id,
@@ -870,7 +1216,7 @@ class ClusterTypesMetricScorerV1(Scorer):
                 'recall'   : recall,
                 'f1'       : f1
                 }
-            scores['{}::[SEP]::{}'.format(gold_entity_id, system_entity_id)] = score
+            scores[(gold_entity_id, system_entity_id)] = score
         for system_entity_id in data['system']:
             gold_entity_id = 'None'
             if system_entity_id not in document_alignment.get('system_to_gold'):
@@ -880,8 +1226,9 @@ class ClusterTypesMetricScorerV1(Scorer):
                     'recall'   : recall,
                     'f1'       : f1
                     }
-                scores['{}::[SEP]::{}'.format(gold_entity_id, system_entity_id)] = score
-                self.record_event('ALIGNMENT_INFO', self.__class__.__name__, document_id, gold_entity_id, system_entity_id, similarity)
+                scores[(gold_entity_id, system_entity_id)] = score
+                if record_alignments:
+                    self.record_event('ALIGNMENT_INFO', self.__class__.__name__, document_id, gold_entity_id, system_entity_id, similarity)
         return scores
 
     def get_parsed_entries(self, entries):
@@ -898,11 +1245,10 @@ class ClusterTypesMetricScorerV1(Scorer):
             document_responses = responses.get(document_id, [])
             document_alignment = self.get('alignment').get('document_alignment').get(document_id)
             document_scores = self.get('document_scores', document_id, document_annotations, document_responses, document_alignment)
-            for gold_entity_id_and_system_entity_id in document_scores:
-                gold_entity_id, system_entity_id = gold_entity_id_and_system_entity_id.split('::[SEP]::')
-                precision = document_scores[gold_entity_id_and_system_entity_id]['precision']
-                recall = document_scores[gold_entity_id_and_system_entity_id]['recall']
-                f1 = document_scores[gold_entity_id_and_system_entity_id]['f1']
+            for (gold_entity_id, system_entity_id), document_score in document_scores.items():
+                precision = document_score['precision']
+                recall = document_score['recall']
+                f1 = document_score['f1']
                 mean_f1 += f1
                 count += 1
                 score = ClusterTypesMetricScoreV1(self.logger,
@@ -916,9 +1262,9 @@ class ClusterTypesMetricScorerV1(Scorer):
                 scores.append(score)
 
         scores_printer = ScorePrinter(self.logger, self.printing_specs, self.separator)
-        for score in multisort(scores, (('document_id', False),
-                                        ('gold_entity_id', False),
-                                        ('system_entity_id', False))):
+        # the scores are plain attributes, read without going through Object.get
+        scores.sort(key=operator.attrgetter('document_id', 'gold_entity_id', 'system_entity_id'))
+        for score in scores:
             scores_printer.add(score)
         mean_f1 = mean_f1 / count if count else 0
         mean_score = ClusterTypesMetricScoreV1(self.logger,
@@ -977,46 +1323,42 @@ class ClusterTypesMetricScorerV2(Scorer):
     def get_parsed_entries(self, entries):
         return(parse_entries(entries, self.get('cluster_by_columnname')))
 
+    def get_type_weights(self, entries):
+        """
+        Returns the array of the weights that each of the entries adds to the types it
+        asserts, i.e. 1.
+        """
+        return np.ones(len(entries), dtype=int)
+
     def get_document_type_scores(self, document_id, gold_entity_id, gold_entries, system_entity_id, system_entries):
-        average_precision = 0.0
-        entity_types = {'gold': {}, 'system': {}}
-        entries = {'gold': gold_entries, 'system': system_entries}
-        for gold_or_system in entity_types:
-            for entry in entries.get(gold_or_system):
-                for expanded_entity_type in expanded_types(list(entry.get('entity_types').split(';'))):
-                    if expanded_entity_type not in entity_types.get(gold_or_system):
-                        entity_types.get(gold_or_system)[expanded_entity_type] = list()
-                    entity_types.get(gold_or_system).get(expanded_entity_type).append(entry)
-
-        type_weights = list()
-        for expanded_entity_type in entity_types.get(gold_or_system):
-            type_weight = {
-                'type': expanded_entity_type,
-                'weight': len(entity_types.get(gold_or_system).get(expanded_entity_type))
-                }
-            type_weights.append(type_weight)
-
-        rank = 0
-        num_correct = 0
-        sum_precision = 0.0
-        for type_weight in multisort(type_weights, (('weight', True),
-                                                    ('type', False))):
-            rank += 1
-            label = 'WRONG'
-            if type_weight.get('type') in entity_types.get('gold'):
-                label = 'RIGHT'
-                num_correct += 1
-                sum_precision += (num_correct/rank)
-            self.record_event('AP_INFO', self.__class__.__name__, document_id, gold_entity_id, system_entity_id, rank, type_weight.get('type'), label, type_weight.get('weight'), num_correct, sum_precision)
-
-        average_precision = sum_precision/len(entity_types.get('gold'))
+        gold_types = get_cluster_types(gold_entries, self.get_type_weights(gold_entries))
+        system_types = get_cluster_types(system_entries, self.get_type_weights(system_entries))
+        # the weights of the system types are summed into an array indexed by type ID;
+        # bincount sums in floating point, so the sums are cast back to the type of the
+        # weights (i.e. integer counts stay integers)
+        weights = np.bincount(system_types.type_ids, weights=system_types.weights).astype(system_types.weights.dtype, copy=False)
+        system_type_ids = np.unique(system_types.type_ids)
+        system_type_weights = tuple(zip(system_type_ids.tolist(), weights[system_type_ids].tolist()))
+        gold_type_ids = tuple(np.unique(gold_types.type_ids).tolist())
+        ranked_type_ids, is_right, num_corrects, sum_precisions, average_precision = rank_types(gold_type_ids, system_type_weights)
+        logger = self.get('logger')
+        if logger.is_enabled('AP_INFO'):
+            ap_events = []
+            # the cached ranking is shared by equal weights of different types (e.g. 1 and
+            # 1.0), so the weights logged are those of this cluster
+            for rank, type_id, right, num_correct, sum_precision in zip(range(1, len(ranked_type_ids) + 1), ranked_type_ids, is_right, num_corrects, sum_precisions):
+                label = 'RIGHT' if right else 'WRONG'
+                ap_events.append((self.__class__.__name__, document_id, gold_entity_id, system_entity_id, rank, TYPE_NAMES[type_id], label, weights[type_id].item(), num_correct, sum_precision))
+            logger.record_events('AP_INFO', ap_events)
         return average_precision
 
     def get_document_scores(self, document_id, document_annotations, document_responses, document_alignment):
+        # the entries of the document, parsed once by score_responses, are passed in
         data = {
-                'gold': self.get('parsed_entries', self.get('gold').get('entries')).get(document_id),
-                'system': self.get('parsed_entries', self.get('system').get('entries')).get(document_id, [])
+                'gold': document_annotations,
+                'system': document_responses
                 }
+        record_alignments = self.get('logger').is_enabled('ALIGNMENT_INFO')
         scores = {}
         for gold_entity_id in data['gold']:
             system_entity_id = 'None'
@@ -1025,13 +1367,14 @@ class ClusterTypesMetricScorerV2(Scorer):
                 system_entity_id = document_alignment.get('gold_to_system').get(gold_entity_id).get('aligned_to')
                 similarity = document_alignment.get('gold_to_system').get(gold_entity_id).get('aligned_similarity')
             average_precision = 0
-            self.record_event('ALIGNMENT_INFO', self.__class__.__name__, document_id, gold_entity_id, system_entity_id, similarity)
+            if record_alignments:
+                self.record_event('ALIGNMENT_INFO', self.__class__.__name__, document_id, gold_entity_id, system_entity_id, similarity)
             if system_entity_id != 'None':
                 average_precision = self.get('document_type_scores', document_id, gold_entity_id, data['gold'][gold_entity_id], system_entity_id, data['system'][system_entity_id])
             score = {
                 'average_precision': average_precision,
                 }
-            scores['{}::[SEP]::{}'.format(gold_entity_id, system_entity_id)] = score
+            scores[(gold_entity_id, system_entity_id)] = score
         for system_entity_id in data['system']:
             gold_entity_id = 'None'
             if system_entity_id not in document_alignment.get('system_to_gold'):
@@ -1039,8 +1382,9 @@ class ClusterTypesMetricScorerV2(Scorer):
                 score = {
                     'average_precision': average_precision,
                     }
-                scores['{}::[SEP]::{}'.format(gold_entity_id, system_entity_id)] = score
-                self.record_event('ALIGNMENT_INFO', self.__class__.__name__, document_id, gold_entity_id, system_entity_id, similarity)
+                scores[(gold_entity_id, system_entity_id)] = score
+                if record_alignments:
+                    self.record_event('ALIGNMENT_INFO', self.__class__.__name__, document_id, gold_entity_id, system_entity_id, similarity)
         return scores
 
     def score_responses(self):
@@ -1054,9 +1398,8 @@ class ClusterTypesMetricScorerV2(Scorer):
             document_responses = responses.get(document_id, [])
             document_alignment = self.get('alignment').get('document_alignment').get(document_id)
             document_scores = self.get('document_scores', document_id, document_annotations, document_responses, document_alignment)
-            for gold_entity_id_and_system_entity_id in document_scores:
-                gold_entity_id, system_entity_id = gold_entity_id_and_system_entity_id.split('::[SEP]::')
-                average_precision = document_scores[gold_entity_id_and_system_entity_id]['average_precision']
+            for (gold_entity_id, system_entity_id), document_score in document_scores.items():
+                average_precision = document_score['average_precision']
                 mean_average_precision += average_precision
                 count += 1
                 score = ClusterTypesMetricScoreV2(self.logger,
@@ -1068,9 +1411,9 @@ class ClusterTypesMetricScorerV2(Scorer):
                 scores.append(score)
 
         scores_printer = ScorePrinter(self.logger, self.printing_specs, self.separator)
-        for score in multisort(scores, (('document_id', False),
-                                        ('gold_entity_id', False),
-                                        ('system_entity_id', False))):
+        # the scores are plain attributes, read without going through Object.get
+        scores.sort(key=operator.attrgetter('document_id', 'gold_entity_id', 'system_entity_id'))
+        for score in scores:
             scores_printer.add(score)
         mean_average_precision = mean_average_precision / count if count else 0
         mean_score = ClusterTypesMetricScoreV2(self.logger,
@@ -1095,40 +1438,13 @@ class ClusterTypesMetricScorerV3(ClusterTypesMetricScorerV2):
     def __init__(self, logger, separator=None, **kwargs):
         super().__init__(logger, separator=separator, **kwargs)
 
-    def get_document_type_scores(self, document_id, gold_entity_id, gold_entries, system_entity_id, system_entries):
-        average_precision = 0.0
-        entity_types = {'gold': {}, 'system': {}}
-        entries = {'gold': gold_entries, 'system': system_entries}
-        for gold_or_system in entity_types:
-            for entry in entries.get(gold_or_system):
-                for expanded_entity_type in expanded_types(list(entry.get('entity_types').split(';'))):
-                    if expanded_entity_type not in entity_types.get(gold_or_system):
-                        entity_types.get(gold_or_system)[expanded_entity_type] = 0
-                    entity_types.get(gold_or_system)[expanded_entity_type] += float(entry.get('confidence'))
-
-        type_weights = list()
-        for expanded_entity_type in entity_types.get(gold_or_system):
-            type_weight = {
-                'type': expanded_entity_type,
-                'weight': entity_types.get(gold_or_system).get(expanded_entity_type)
-                }
-            type_weights.append(type_weight)
-
-        rank = 0
-        num_correct = 0
-        sum_precision = 0.0
-        for type_weight in multisort(type_weights, (('weight', True),
-                                                    ('type', False))):
-            rank += 1
-            label = 'WRONG'
-            if type_weight.get('type') in entity_types.get('gold'):
-                label = 'RIGHT'
-                num_correct += 1
-                sum_precision += (num_correct/rank)
-            self.record_event('AP_INFO', self.__class__.__name__, document_id, gold_entity_id, system_entity_id, rank, type_weight.get('type'), label, type_weight.get('weight'), num_correct, sum_precision)
-
-        average_precision = sum_precision/len(entity_types.get('gold'))
-        return average_precision
+    def get_type_weights(self, entries):
+        """
+        Returns the array of the weights that each of the entries adds to the types it
+        asserts, i.e. its confidence.
+        """
+        # the confidences are converted to floats by numpy, all at once
+        return np.array([entry.get('confidence') for entry in entries], dtype=np.float64)
 
 class MentionTypesMetricScorerV1(ClusterTypesMetricScorerV1):
     """
@@ -1218,23 +1534,78 @@ class ScoresManager(Object):
         self.scores = Container(logger)
         self.score_responses()
 
+    def get_scorer(self, metric, logger):
+        return self.get('metrics')[metric](logger=logger,
+                                           run_id=self.get('run_id'),
+                                           gold=self.get('gold'),
+                                           system=self.get('system'),
+                                           cluster_alignment=self.get('cluster_alignment'),
+                                           mention_alignment=self.get('mention_alignment'),
+                                           separator=self.get('separator'))
+
     def score_responses(self):
-        for metric in self.get('metrics'):
-            scorer = self.get('metrics')[metric](logger=self.get('logger'),
-                                                 run_id=self.get('run_id'),
-                                                 gold=self.get('gold'),
-                                                 system=self.get('system'),
-                                                 cluster_alignment=self.get('cluster_alignment'),
-                                                 mention_alignment=self.get('mention_alignment'),
-                                                 separator=self.get('separator'))
-            self.get('scores').add(key=metric, value=scorer)
+        logger = self.get('logger')
+        metrics = list(self.get('metrics'))
+        workers = self.get('workers')
+        if workers == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            for metric in metrics:
+                scorer = self.get('scorer', metric, logger)
+                self.get('scores').add(key=metric, value=scorer.get('scores'))
+            return
+        # the metrics are independent of each other so score them in parallel; the
+        # workers are forked so that they inherit the (unpicklable) loaded files and
+        # alignments, and their events are recorded here, one metric after the other,
+        # so that the log is the same as when scoring sequentially
+        disabled_event_codes = frozenset(event_code for event_code in logger.event_specs if not logger.is_enabled(event_code))
+        nonfatal_event_codes = frozenset(event_code for event_code, event_object in logger.event_specs.items() if event_object['level'] in logger.log_methods)
+        with ProcessPoolExecutor(max_workers=min(len(metrics), workers or len(metrics)),
+                                 mp_context=multiprocessing.get_context('fork'),
+                                 initializer=init_scoring_worker,
+                                 initargs=(self,)) as executor:
+            futures = [executor.submit(score_metric, metric, disabled_event_codes, nonfatal_event_codes) for metric in metrics]
+            for metric, future in zip(metrics, futures):
+                scores, events = future.result()
+                if scores is None:
+                    # the Logger exits upon the last of the events, so the metrics not yet
+                    # being scored are dropped
+                    for pending_future in futures:
+                        pending_future.cancel()
+                for event_code, argslsts in events:
+                    logger.record_events(event_code, argslsts)
+                scores.set('logger', logger)
+                self.get('scores').add(key=metric, value=scores)
 
     def print_scores(self, output_directory):
         os.mkdir(output_directory)
         for metric in self.get('scores'):
             scores = self.get('scores').get(metric)
             output_file = '{}/{}-scores.txt'.format(output_directory, metric)
-            scores.print_scores(output_file)
+            with open(output_file, 'w') as fh:
+                fh.write(scores.__str__())
+
+# the ScoresManager of the parent process, set in each scoring worker
+scores_manager = None
+
+def init_scoring_worker(manager):
+    global scores_manager
+    scores_manager = manager
+
+def score_metric(metric, disabled_event_codes, nonfatal_event_codes):
+    """
+    Score metric in a scoring worker, and return the tuple (scores, events) where
+    scores is the ScorePrinter of the scorer and events is the list of the events
+    that it recorded, as expected by EventRecorder.
+
+    If the scorer records an event upon which the Logger exits, scoring stops there
+    and scores is None; the Logger of the parent process exits when recording the
+    last of the events.
+    """
+    recorder = EventRecorder(disabled_event_codes, nonfatal_event_codes)
+    try:
+        scorer = scores_manager.get('scorer', metric, recorder)
+    except EventRecorder.FatalEvent:
+        return None, recorder.events
+    return scorer.get('scores'), recorder.events
 
 def check_for_paths_existance(paths):
     for path in paths:
@@ -1258,10 +1629,11 @@ def main(args):
     header = ['run_id', 'mention_id', 'mention_string', 'mention_span', 'entity_id', 'entity_types', 'mention_type', 'confidence']
     gold = FileHandler(logger, args.gold, header=FileHeader(logger, '\t'.join(header)), encoding='utf-8')
     system = FileHandler(logger, args.system, header=FileHeader(logger, '\t'.join(header)), encoding='utf-8')
-    cluster_alignment = Alignment(logger, gold, system, 'entity_id')
-    mention_alignment = Alignment(logger, gold, system, 'mention_span')
+    cluster_alignment = Alignment(logger, gold, system, 'entity_id', args.workers)
+    mention_alignment = Alignment(logger, gold, system, 'mention_span', args.workers)
     arguments = {
         'run_id': args.run,
+        'workers': args.workers,
         'cluster_alignment': cluster_alignment,
         'mention_alignment': mention_alignment,
         'gold': gold,
@@ -1277,6 +1649,7 @@ if __name__ == '__main__':
     parser.add_argument('-l', '--log', default='log.txt', help='Specify a file to which log output should be redirected (default: %(default)s)')
     parser.add_argument('-r', '--run', default='runID', help='Specify the run ID (default: %(default)s)')
     parser.add_argument('-v', '--version', action='version', version='%(prog)s ' + __version__, help='Print version number and exit')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='Specify the maximum number of worker processes used for aligning, and for scoring (default: the number of CPUs)')
     parser.add_argument('-S', '--separator', default='pretty', choices=['pretty', 'tab', 'space'], help='Column separator for scorer output? (default: %(default)s)')
     parser.add_argument('log_specifications', type=str, help='File containing error specifications')
     parser.add_argument('gold', type=str, help='Input gold annotations file')